@@ -1,13 +1,30 @@
-import pickle
-import numpy as np
-import tensorflow as tf
-import matplotlib.pyplot as plt
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, make_response
 from flask_cors import CORS
 import os
+import re
+import hmac
+import math
+import functools
+import multiprocessing
 import pandas as pd
+import sys
+import threading
 import traceback
 import logging
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import forecasting
+from utils import modelpack
+from utils.admission import AdmissionController, Deadline, Rejected, SingleFlight
+from utils.ingest import IngestHub, ForecastCache, tail_into
+from utils.workers import InferencePool, WorkerError, configure_threads
+from utils import scenarios
+from utils import portfolio
+from utils.profiling import RequestProfiler
+from utils.global_model import open_global_model, forecast_mixed
+from utils.audit import AuditLog, to_epoch
+from utils import memory
 
 
 # ------------------------
@@ -27,54 +44,218 @@ os.makedirs(PLOTS_DIR, exist_ok=True)
 
 
 # ------------------------
-# Model / Scaler / Dataset Paths
-# ------------------------
-models = {
-    "HDFC": "models/hdfc_model.h5",
-    "Reliance": "models/stock_price_model.h5",
-    "Adani": "models/adani_model.h5",
-    "TCS": "models/tcs_model.h5",
-    "Honda": "models/honda_model.h5",
-    "Sony": "models/sony_model.h5",
-    "Nintendo": "models/nintendo_model.h5",
-    "Alibaba": "models/alibaba_model.h5",
-    "Xiaomi": "models/xiaomi_model.h5",
-    "Tencent": "models/tencent_stock_price_model.h5",
-    "Toyota": "models/toyota_stock_price_model.h5",
-    "JD.com Inc": "models/jdhk_model.h5",
-}
-
-
-scalers = {
-    "HDFC": "scalers/hdfc_scaler.pkl",
-    "Reliance": "scalers/nse_scaler.pkl",
-    "TCS": "scalers/tcs_scaler.pkl",
-    "Adani": "scalers/adani_scaler.pkl",
-    "Honda": "scalers/honda_scaler.pkl",
-    "Sony": "scalers/sony_scaler.pkl",
-    "Nintendo": "scalers/nintendo_scaler.pkl",
-    "Alibaba": "scalers/alibaba_scaler.pkl",
-    "Xiaomi": "scalers/xiaomi_scaler.pkl",
-    "Tencent": "scalers/tencent_scaler.pkl",
-    "Toyota": "scalers/toyota_scaler.pkl",
-    "JD.com Inc": "scalers/jdhk_scaler.pkl",
-}
-
-
-datasets = {
-    "HDFC": "scaled_data/hdfc_scaled_data.pkl",
-    "Reliance": "scaled_data/nse_scaled_data.pkl",
-    "TCS": "scaled_data/tcs_scaled_data.pkl",
-    "Adani": "scaled_data/adani_scaled_data.pkl",
-    "Honda": "scaled_data/honda_scaled_data.pkl",
-    "Sony": "scaled_data/sony_scaled_data.pkl",
-    "Nintendo": "scaled_data/nintendo_scaled_data.pkl",
-    "Alibaba": "scaled_data/alibaba_scaled_data.pkl",
-    "Xiaomi": "scaled_data/xiaomi_scaled_data.pkl",
-    "Tencent": "scaled_data/tencent_scaled_data.pkl",
-    "Toyota": "scaled_data/toyota_scaled_data.pkl",
-    "JD.com Inc": "scaled_data/jdhk_scaled_data.pkl",
-}
+# Model / Scaler / Dataset Paths (shared with utils/forecasting.py)
+# ------------------------
+models = dict(forecasting.MODELS)
+scalers = dict(forecasting.SCALERS)
+datasets = dict(forecasting.DATASETS)
+
+
+# ------------------------
+# Sharded deployment: SHARD_TICKERS="HDFC,Sony,..." makes this node serve (and
+# load) only that subset; backend/router.py routes companies to nodes. With
+# ROUTER_REPLICAS set, the router replaces the subset via PUT /shard as nodes
+# join and leave (artifacts are loaded lazily, so a new ticker costs one load)
+# ------------------------
+SHARD_TICKERS = [t.strip() for t in os.environ.get("SHARD_TICKERS", "").split(",") if t.strip()]
+if SHARD_TICKERS:
+    models = {k: v for k, v in models.items() if k in SHARD_TICKERS}
+
+
+# ------------------------
+# Serving mode: "live" runs inference per request, "store" answers from the
+# nightly precomputed store (python -m utils.forecasting precompute) and falls
+# back to live inference on a miss
+# ------------------------
+FORECAST_MODE = os.environ.get("FORECAST_MODE", "live").lower()
+FORECAST_STORE_PATH = os.environ.get("FORECAST_STORE", "forecast_store.npz")
+forecast_store = forecasting.open_store(FORECAST_STORE_PATH) if FORECAST_MODE == "store" else None
+if FORECAST_MODE == "store" and forecast_store is None:
+    logging.warning(f"Store mode requested but {FORECAST_STORE_PATH} is missing; serving live")
+
+
+# ------------------------
+# Model pack: all tickers' weights + scalers in one memory-mapped file
+# (python -m utils.modelpack build --float16 --verify); per-ticker .h5/.pkl are
+# used for anything the pack does not contain
+# ------------------------
+model_pack = modelpack.open_pack(os.environ.get("MODEL_PACK", "models.pack"))
+
+
+# ------------------------
+# Inference workers: INFERENCE_WORKERS processes, each with INFERENCE_THREADS
+# intra-op threads (and pinned cores with INFERENCE_AFFINITY=1); tickers stick to
+# the worker that already has them loaded. 0 keeps inference in the request thread.
+# ------------------------
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 1))
+INFERENCE_AFFINITY = os.environ.get("INFERENCE_AFFINITY", "0") == "1"
+
+
+# ------------------------
+# Global model: GLOBAL_MODEL=models/global_model.h5 (python -m utils.global_model) serves
+# every ticker in its vocabulary from one shared LSTM (scalers/datasets stay per ticker);
+# batches of companies then share one forward pass per day. With inference workers the
+# weights are loaded in the workers only and this process keeps just the vocabulary.
+# ------------------------
+GLOBAL_MODEL_PATH = os.environ.get("GLOBAL_MODEL", "")
+global_model = None
+if GLOBAL_MODEL_PATH and multiprocessing.parent_process() is None:
+    global_model = open_global_model(GLOBAL_MODEL_PATH, with_model=INFERENCE_WORKERS == 0)
+    if global_model is None:
+        logging.warning(f"GLOBAL_MODEL={GLOBAL_MODEL_PATH} (or its .json vocabulary) is missing or failed to load; using per-ticker models")
+
+
+worker_pool = None
+# spawned workers re-import the __main__ module; only the serving process owns a pool
+if INFERENCE_WORKERS > 0 and multiprocessing.parent_process() is None:
+    worker_pool = InferencePool(INFERENCE_WORKERS, INFERENCE_THREADS, INFERENCE_AFFINITY,
+                                base_dir=os.getcwd(), pack_path=model_pack.path if model_pack else None,
+                                global_path=os.path.abspath(GLOBAL_MODEL_PATH) if global_model else None)
+elif "INFERENCE_THREADS" in os.environ:
+    configure_threads(INFERENCE_THREADS)
+
+
+# ------------------------
+# Admission control: horizon limit, bounded inference concurrency + wait queue,
+# per-request deadline (seconds, 0 disables)
+# ------------------------
+MAX_FORECAST_DAYS = int(os.environ.get("MAX_FORECAST_DAYS", forecasting.MAX_HORIZON))
+REQUEST_DEADLINE = float(os.environ.get("REQUEST_DEADLINE", 25))
+admission = AdmissionController(
+    max_concurrent=int(os.environ.get("INFERENCE_CONCURRENCY", 2)),
+    max_queue=int(os.environ.get("INFERENCE_QUEUE", 8)),
+    queue_timeout=float(os.environ.get("INFERENCE_QUEUE_TIMEOUT", 10)),
+)
+# identical concurrent live predictions (company, days, live-feed version) share one
+# computation; SINGLE_FLIGHT=0 disables
+single_flight = SingleFlight() if os.environ.get("SINGLE_FLIGHT", "1") == "1" else None
+
+
+# ------------------------
+# On-demand profiling: a request with "X-Profile: 1" from an admin ("X-Admin-Token"
+# when ADMIN_TOKEN is set, otherwise loopback callers only) is profiled, or a PROFILE_SAMPLE_RATE share of traffic once
+# enabled via POST /admin/profiling; at most PROFILE_MAX_PER_MINUTE per minute.
+# PROFILE_MODE "sample" writes folded stacks (flamegraph.pl / speedscope),
+# "cprofile" writes pstats files; PROFILE_DIR keeps the newest PROFILE_MAX_FILES.
+# ------------------------
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+profiler = RequestProfiler(
+    os.environ.get("PROFILE_DIR", "profiles"),
+    mode=os.environ.get("PROFILE_MODE", "sample"),
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0.01)),
+    max_per_minute=int(os.environ.get("PROFILE_MAX_PER_MINUTE", 6)),
+    max_files=int(os.environ.get("PROFILE_MAX_FILES", 200)),
+)
+profiler.configure(enabled=os.environ.get("PROFILE_ENABLED", "0") == "1")
+
+
+LOOPBACK = ("127.0.0.1", "::1")
+
+
+def admin_allowed(token, remote_addr):
+    # with ADMIN_TOKEN set the token is required; without one, only local callers
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(token or "", ADMIN_TOKEN)
+    return remote_addr in LOOPBACK
+
+
+def is_admin():
+    return admin_allowed(request.headers.get("X-Admin-Token"), request.remote_addr)
+
+
+def profile_label(name, company=None, days=None):
+    # profile filenames carry the ticker / horizon being profiled
+    parts = [name, str(company or ""), str(days or "")]
+    return re.sub(r"[^A-Za-z0-9.-]+", "-", "_".join(p for p in parts if p))
+
+
+def profiled(name):
+    def wrap(view):
+        @functools.wraps(view)
+        def handler(*args, **kwargs):
+            forced = request.headers.get("X-Profile") == "1" and is_admin()
+            if not profiler.wanted(forced):
+                return view(*args, **kwargs)
+            data = request.get_json(silent=True) if request.is_json else None
+            data = data if isinstance(data, dict) else {}
+            label = profile_label(name, data.get("company") or request.args.get("company"), data.get("days"))
+            result, filename = profiler.run(label, view, *args, **kwargs)
+            response = make_response(result)
+            response.headers["X-Profile"] = filename
+            return response
+        return handler
+    return wrap
+
+
+# ------------------------
+# Forecast audit log: every served forecast (ticker, horizon, model hash, source,
+# values) is buffered and appended in batches by a background thread to
+# AUDIT_DIR; score it with python -m utils.audit accuracy. AUDIT_LOG=0 disables.
+# ------------------------
+audit_log = None
+if os.environ.get("AUDIT_LOG", "1") == "1" and multiprocessing.parent_process() is None:
+    audit_log = AuditLog(
+        os.environ.get("AUDIT_DIR", "audit"),
+        flush_interval=float(os.environ.get("AUDIT_FLUSH_INTERVAL", 5)),
+        rotate_bytes=int(float(os.environ.get("AUDIT_ROTATE_MB", 64)) * 1024 * 1024),
+        max_files=int(os.environ.get("AUDIT_MAX_FILES", 100)),
+    )
+model_hashes = {}
+
+
+def model_hash(company_key):
+    # sha256 prefix of the weights serving this ticker. The global model and the pack are
+    # fixed for the life of the process; per-ticker .h5 files are reloaded on every request,
+    # so their hash is keyed on path + mtime and a retrain (or a new *_direct.h5) shows up
+    if global_model is not None and company_key in global_model:
+        key, compute = ("global", global_model.path), lambda: modelpack.file_sha256(global_model.path)
+    elif model_pack is not None and company_key in model_pack:
+        key, compute = ("pack", company_key), lambda: model_pack.metadata(company_key).get("sha256", "")
+    else:
+        model_path = models[company_key]
+        if file_exists(forecasting.direct_path(model_path)):
+            model_path = forecasting.direct_path(model_path)
+        try:
+            key = (model_path, os.path.getmtime(model_path))
+        except OSError:
+            return ""
+        compute = lambda: modelpack.file_sha256(model_path)
+    if key not in model_hashes:
+        model_hashes[key] = compute()[:16]
+    return model_hashes[key]
+
+
+def forecast_origin(company_key, source):
+    # as-of time of the forecast's input: the last live bar; None for the stored snapshot
+    # (and store answers built from it), which carries no dates. The store's build time is
+    # when it was computed, not what data it saw, so it is not used as an origin.
+    feed = ingest_hub.feed(company_key) if source != "store" else None
+    if feed is None or not feed.last_timestamp:
+        return None
+    try:
+        return to_epoch(feed.last_timestamp)
+    except (TypeError, ValueError):
+        return None
+
+
+def audit(result, days, source):
+    if audit_log is not None and result.get("forecast") is not None:
+        company_key = result["company"]
+        audit_log.record(company_key, days, model_hash(company_key), result["forecast"], source,
+                         forecast_origin(company_key, source))
+
+
+# ------------------------
+# Memory accounting: per-ticker artifact sizes and RSS growth across loads, plus
+# Python heap tracing with MEMORY_TRACE=1 (tracemalloc, MEMORY_TRACE_FRAMES deep);
+# reported at GET /admin/memory
+# ------------------------
+# (serving process only: spawned workers re-import this module and would trace themselves)
+if (os.environ.get("MEMORY_TRACE", "0") == "1" and not tracemalloc.is_tracing()
+        and multiprocessing.parent_process() is None):
+    tracemalloc.start(int(os.environ.get("MEMORY_TRACE_FRAMES", 1)))
+ticker_memory = memory.TickerMemory()
 
 
 # ------------------------
@@ -102,19 +283,7 @@ country_grsi_df = load_csv(os.path.join(DATASET_DIR, "country_GRSI.csv"))
 # Helper: fuzzy match company name (exact, then contains)
 # ------------------------
 def find_company_row(company_name: str):
-    if company_risk_df.empty:
-        return pd.DataFrame()
-    name = company_name.strip().lower()
-    # exact (case-insensitive)
-    exact = company_risk_df[company_risk_df["company"].str.lower() == name]
-    if not exact.empty:
-        return exact.iloc[[0]]
-    # contains
-    contains = company_risk_df[company_risk_df["company"].str.lower().str.contains(name)]
-    if not contains.empty:
-        return contains.iloc[[0]]
-    # no match
-    return pd.DataFrame()
+    return forecasting.find_company_row(company_risk_df, company_name)
 
 
 # ------------------------
@@ -129,6 +298,7 @@ def home():
 # Company risk list
 # ------------------------
 @app.route("/company_risk", methods=["GET"])
+@profiled("company_risk")
 def get_company_risk():
     try:
         return jsonify(company_risk_df.to_dict(orient="records"))
@@ -141,6 +311,7 @@ def get_company_risk():
 # Country GRSI list
 # ------------------------
 @app.route("/country_GRSI", methods=["GET"])
+@profiled("country_grsi")
 def get_country_grsi():
     try:
         return jsonify(country_grsi_df.to_dict(orient="records"))
@@ -150,33 +321,39 @@ def get_country_grsi():
 
 
 # ------------------------
-# GRSI lookup (company-specific or full country map)
+# GRSI lookup (company-specific or full country map): returns (payload, status);
+# shared with the ASGI app
 # ------------------------
+def grsi_lookup(company=None):
+    if company:
+        row = find_company_row(company)
+        if row.empty:
+            return {"error": "Company not found"}, 404
+        # column is 'grsi' after normalization
+        score = row.iloc[0].get("grsi")
+        if pd.isna(score):
+            return {"error": "GRSI value missing for company"}, 404
+        # return uppercase key 'GRSI' to match frontend expectation
+        return {"company": row.iloc[0]["company"], "GRSI": float(score)}, 200
+
+
+    # no company given -> return country-level map
+    if country_grsi_df.empty:
+        return {"GRSI": {}}, 200
+    # country and grsi columns expected
+    if "country" in country_grsi_df.columns and "grsi" in country_grsi_df.columns:
+        country_scores = dict(zip(country_grsi_df["country"], country_grsi_df["grsi"].astype(float)))
+        return {"GRSI": country_scores}, 200
+    else:
+        return {"GRSI": {}}, 200
+
+
 @app.route("/grsi", methods=["GET"])
+@profiled("grsi")
 def get_grsi():
     try:
-        company = request.args.get("company")
-        if company:
-            row = find_company_row(company)
-            if row.empty:
-                return jsonify({"error": "Company not found"}), 404
-            # column is 'grsi' after normalization
-            score = row.iloc[0].get("grsi")
-            if pd.isna(score):
-                return jsonify({"error": "GRSI value missing for company"}), 404
-            # return uppercase key 'GRSI' to match frontend expectation
-            return jsonify({"company": row.iloc[0]["company"], "GRSI": float(score)}), 200
-
-
-        # no company given -> return country-level map
-        if country_grsi_df.empty:
-            return jsonify({"GRSI": {}}), 200
-        # country and grsi columns expected
-        if "country" in country_grsi_df.columns and "grsi" in country_grsi_df.columns:
-            country_scores = dict(zip(country_grsi_df["country"], country_grsi_df["grsi"].astype(float)))
-            return jsonify({"GRSI": country_scores}), 200
-        else:
-            return jsonify({"GRSI": {}}), 200
+        payload, status = grsi_lookup(request.args.get("company"))
+        return jsonify(payload), status
 
 
     except Exception:
@@ -192,213 +369,685 @@ def file_exists(path):
 
 
 # ------------------------
-# Predict endpoint
+# Response builder (shared by live and store paths)
 # ------------------------
-@app.route("/predict", methods=["POST"])
-def predict():
+def build_result(company_key, forecast_rescaled, plot_filename, company_risk_value, country_grsi_value):
+    plot_url = f"http://127.0.0.1:5000/plots/{plot_filename}" if plot_filename else None
+    return {
+        "company": company_key,
+        "low_likely": float(min(forecast_rescaled)),
+        "high_likely": float(max(forecast_rescaled)),
+        "forecast": list(map(float, forecast_rescaled)),
+        "plot_url": plot_url,
+        "company_risk": company_risk_value,
+        "country_grsi": country_grsi_value,
+    }
+
+
+# ------------------------
+# Live inference: returns (payload, status)
+# ------------------------
+class ArtifactError(Exception):
+    pass
+
+
+def load_artifacts(company_key, with_model=True):
+    model_path = models[company_key]
+    # a direct multi-horizon model (python -m utils.training --direct) replaces the day-by-day loop
+    if file_exists(forecasting.direct_path(model_path)):
+        model_path = forecasting.direct_path(model_path)
+    scaler_path = scalers.get(company_key)
+    dataset_path = datasets.get(company_key)
+    packed = model_pack is not None and company_key in model_pack
+    shared = global_model is not None and company_key in global_model
+
+
+    # Check files exist (model/scaler come from the pack when it has this ticker)
+    missing = []
+    if with_model and not packed and not shared and not file_exists(model_path):
+        missing.append(model_path)
+    if not packed and not file_exists(scaler_path):
+        missing.append(scaler_path)
+    if not file_exists(dataset_path):
+        missing.append(dataset_path)
+    if missing:
+        msg = f"Missing files for {company_key}: {missing}"
+        logging.error(msg)
+        raise ArtifactError(msg)
+
+
+    # Load model, scaler, dataset
+    rss_before = memory.rss_bytes()
+    model = None
     try:
-        data = request.get_json() or {}
-        company = data.get("company")
-        days = int(data.get("days", 5))
+        if with_model and shared:
+            model = global_model.bind([company_key])
+        elif with_model:
+            model = model_pack.model(company_key) if packed else forecasting.load_model(model_path)
+    except Exception:
+        logging.error(f"Failed to load model {model_path}:\n{traceback.format_exc()}")
+        raise ArtifactError(f"Failed to load model for {company_key}")
+
 
+    try:
+        scaler = model_pack.scaler(company_key) if packed else forecasting.load_pickle(scaler_path)
+    except Exception:
+        logging.error(f"Failed to load scaler {scaler_path}:\n{traceback.format_exc()}")
+        raise ArtifactError(f"Failed to load scaler for {company_key}")
 
-        if not company:
-            return jsonify({"error": "Company is required"}), 400
 
+    try:
+        data_scaled = forecasting.load_dataset(dataset_path)
+    except Exception:
+        logging.error(f"Failed to load dataset {dataset_path}:\n{traceback.format_exc()}")
+        raise ArtifactError(f"Failed to load dataset for {company_key}")
 
-        if company not in models:
-            # tolerate case-insensitive mapping: try to find a key equal ignoring case
-            match_key = next((k for k in models.keys() if k.lower() == company.lower()), None)
-            if match_key:
-                company_key = match_key
-            else:
-                # continue but return an error listing available companies
-                return jsonify({"error": f"Invalid company. Available: {list(models.keys())}"}), 400
+    ticker_memory.loaded(company_key, model, data_scaled, rss_before)
+    return model, scaler, data_scaled
+
+
+def run_inference(company_key, days, window=None, deadline=None):
+    # in-process inference (INFERENCE_WORKERS=0)
+    model, scaler, data_scaled = load_artifacts(company_key)
+    try:
+        return forecasting.forecast_series(model, scaler, data_scaled, days, window, deadline=deadline)
+    except forecasting.ForecastError as exc:
+        raise ArtifactError(f"{company_key}: {exc}")
+
+
+def live_predict(company_key, days, deadline=None):
+    # once live bars have arrived for this ticker the rollout starts from its ring buffer
+    feed = ingest_hub.feed(company_key)
+    window, version = feed.snapshot() if feed is not None else (None, None)
+
+
+    # Backtest tail + forecast, in a worker process when the pool is enabled
+    try:
+        if worker_pool is not None:
+            out = worker_pool.run(company_key, days, window, deadline)
         else:
-            company_key = company
+            out = run_inference(company_key, days, window, deadline)
+    except (ArtifactError, WorkerError) as exc:
+        return {"error": str(exc)}, 500
+    if feed is not None:
+        live_forecasts.put(company_key, version, out["forecast_scaled"])
 
 
-        model_path = models[company_key]
-        scaler_path = scalers.get(company_key)
-        dataset_path = datasets.get(company_key)
+    # Save plot
+    try:
+        plot_filename = forecasting.render_plot(out["actual"], out["predicted"], company_key, PLOTS_DIR)
+    except Exception:
+        logging.error("Failed to create/save plot:\n" + traceback.format_exc())
+        plot_filename = None
 
 
-        # Check files exist
-        missing = []
-        if not file_exists(model_path):
-            missing.append(model_path)
-        if not file_exists(scaler_path):
-            missing.append(scaler_path)
-        if not file_exists(dataset_path):
-            missing.append(dataset_path)
-        if missing:
-            msg = f"Missing files for {company_key}: {missing}"
-            logging.error(msg)
-            return jsonify({"error": msg}), 500
+    # GeoRisk lookup (company risk and country GRSI)
+    company_risk_value, country_grsi_value = forecasting.risk_join(company_key, company_risk_df, country_grsi_df)
+    return build_result(company_key, out["forecast"], plot_filename, company_risk_value, country_grsi_value), 200
 
 
-        # Load model, scaler, dataset
-        try:
-            model = tf.keras.models.load_model(model_path, compile=False)
-        except Exception:
-            logging.error(f"Failed to load model {model_path}:\n{traceback.format_exc()}")
-            return jsonify({"error": f"Failed to load model for {company_key}"}), 500
+# ------------------------
+# Live bar ingestion: per-ticker ring buffers seeded from the stored snapshot;
+# each bar bumps the feed version, which invalidates that ticker's cached forecast
+# ------------------------
+def seed_feed(company_key):
+    _, scaler, data_scaled = load_artifacts(company_key, with_model=False)
+    return scaler, data_scaled
 
 
-        try:
-            with open(scaler_path, "rb") as f:
-                scaler = pickle.load(f)
-        except Exception:
-            logging.error(f"Failed to load scaler {scaler_path}:\n{traceback.format_exc()}")
-            return jsonify({"error": f"Failed to load scaler for {company_key}"}), 500
+ingest_hub = IngestHub(seed_feed)
+live_forecasts = ForecastCache()
+ingest_hub.on_update(lambda company_key, version: live_forecasts.invalidate(company_key))
 
 
-        try:
-            with open(dataset_path, "rb") as f:
-                data_scaled = pickle.load(f)
-        except Exception:
-            logging.error(f"Failed to load dataset {dataset_path}:\n{traceback.format_exc()}")
-            return jsonify({"error": f"Failed to load dataset for {company_key}"}), 500
+def ingest_bar(bar):
+    company_key = forecasting.match_company_key(str(bar["company"]), models)
+    if company_key is None:
+        raise ValueError(f"Unknown company {bar['company']}")
+    return company_key, ingest_hub.ingest(company_key, float(bar["close"]), bar.get("timestamp"))
+
+
+if os.environ.get("INGEST_TAIL") and multiprocessing.parent_process() is None:
+    tail_into(ingest_bar, os.environ["INGEST_TAIL"])
+
+
+# ------------------------
+# Request validation: (company_key, days, None) or (None, None, (payload, status, headers))
+# ------------------------
+def validate(data):
+    company = data.get("company")
+    try:
+        days = int(data.get("days", 5))
+    except (TypeError, ValueError):
+        return None, None, ({"error": "days must be an integer"}, 400, {})
+
+
+    if not company:
+        return None, None, ({"error": "Company is required"}, 400, {})
+
+
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        return None, None, ({"error": f"days must be between 1 and {MAX_FORECAST_DAYS}"}, 400, {})
+
+
+    # tolerate case-insensitive mapping
+    company_key = forecasting.match_company_key(company, models)
+    if company_key is None:
+        return None, None, ({"error": f"Invalid company. Available: {list(models.keys())}"}, 400, {})
+    return company_key, days, None
+
+
+def existing_plot(company_key):
+    plot_filename = f"{company_key}_actual_vs_predicted.png"
+    return plot_filename if file_exists(os.path.join(PLOTS_DIR, plot_filename)) else None
+
+
+# ------------------------
+# Answers without inference: (payload, headers) or None
+# ------------------------
+def precomputed(company_key, days):
+    # Live bars: answer from the per-ticker cache while the feed has not moved
+    feed = ingest_hub.feed(company_key)
+    if feed is not None:
+        cached = live_forecasts.get(company_key, feed.version, days)
+        if cached is not None:
+            forecast_rescaled = forecasting.inverse_close(feed.scaler, cached, feed.n_features)
+            company_risk_value, country_grsi_value = forecasting.risk_join(company_key, company_risk_df, country_grsi_df)
+            result = build_result(company_key, forecast_rescaled, existing_plot(company_key),
+                                  company_risk_value, country_grsi_value)
+            return result, {"X-Forecast-Source": "live-cache"}
+
+
+    # Serve-from-store mode: a lookup, falling back to live inference on a miss
+    # (the store is stale for tickers receiving live bars)
+    if forecast_store is not None and feed is None:
+        entry = forecast_store.lookup(company_key, days)
+        if entry is not None:
+            result = build_result(company_key, entry["forecast"], entry["plot"],
+                                  entry["company_risk"], entry["country_grsi"])
+            return result, {"X-Forecast-Source": "store"}
+        logging.info(f"Forecast store miss for {company_key} ({days} days); running live")
+    return None
+
+
+# ------------------------
+# Single prediction: returns (payload, status, headers); shared by /predict and /predict_batch
+# ------------------------
+def predict_one(data, deadline):
+    company_key, days, error = validate(data)
+    if error is not None:
+        return error
+
+
+    hit = precomputed(company_key, days)
+    if hit is not None:
+        audit(hit[0], days, hit[1]["X-Forecast-Source"])
+        return hit[0], 200, hit[1]
+
+
+    # Live inference goes through the admission layer (429/503 + Retry-After when saturated);
+    # duplicates of an in-flight request wait for its result instead of recomputing it
+    def compute():
+        with admission.slot(deadline):
+            return live_predict(company_key, days, deadline)
+
+    try:
+        if single_flight is not None:
+            feed = ingest_hub.feed(company_key)
+            key = (company_key, days, feed.version if feed is not None else None)
+            (payload, status), shared = single_flight.do(key, compute, deadline)
+        else:
+            (payload, status), shared = compute(), False
+    except Rejected as exc:
+        logging.warning(f"/predict rejected for {company_key}: {exc}")
+        return {"error": str(exc)}, exc.status, {"Retry-After": str(exc.retry_after)}
+    source = "live-shared" if shared else "live"
+    if status == 200:
+        audit(payload, days, source)
+    return payload, status, {"X-Forecast-Source": source}
 
 
-        # Ensure data_scaled is a numpy array
-        data_scaled = np.array(data_scaled)
-        if data_scaled.ndim == 1:
-            # make it 2D with single column
-            data_scaled = data_scaled.reshape(-1, 1)
+# ------------------------
+# Global model: forecasts for any mix of companies from one batch (rescaled per ticker)
+# ------------------------
+def global_forecasts(company_keys, days, deadline=None):
+    if worker_pool is not None:
+        # same thread budget as per-ticker inference: the rollout runs on a worker
+        windows = []
+        for key in company_keys:
+            feed = ingest_hub.feed(key)
+            windows.append(feed.snapshot()[0] if feed is not None else None)
+        return worker_pool.run_global(company_keys, days, windows, deadline)
+    windows, scalers_used = [], []
+    for key in company_keys:
+        _, scaler, data_scaled = load_artifacts(key, with_model=False)
+        feed = ingest_hub.feed(key)
+        windows.append(feed.snapshot()[0] if feed is not None else data_scaled[-global_model.seq_length:])
+        scalers_used.append((scaler, data_scaled.shape[1]))
+    paths = forecast_mixed(global_model, company_keys, windows, days, deadline)
+    return [forecasting.inverse_close(scaler, path, n_features) for path, (scaler, n_features) in zip(paths, scalers_used)]
+
+
+def predict_many(items, new_deadline):
+    # per-item predict_one, except that with a global model every live item shares one rollout
+    # (to the longest horizon, sliced per item; plots are the latest rendered ones)
+    if global_model is None:
+        results = []
+        for item in items:
+            payload, status, _ = predict_one(item if isinstance(item, dict) else {}, new_deadline())
+            results.append(dict(payload, status=status))
+        return results
+
+    results, pending = [None] * len(items), []
+    for idx, item in enumerate(items):
+        data = item if isinstance(item, dict) else {}
+        company_key, days, error = validate(data)
+        if error is not None:
+            results[idx] = dict(error[0], status=error[1])
+            continue
+        hit = precomputed(company_key, days)
+        if hit is not None:
+            audit(hit[0], days, hit[1]["X-Forecast-Source"])
+            results[idx] = dict(hit[0], status=200)
+        elif company_key in global_model:
+            pending.append((idx, company_key, days))
+        else:
+            payload, status, _ = predict_one(data, new_deadline())
+            results[idx] = dict(payload, status=status)
+    if not pending:
+        return results
+
+    deadline = new_deadline()
+    try:
+        with admission.slot(deadline):
+            paths = global_forecasts([key for _, key, _ in pending], max(days for _, _, days in pending), deadline)
+    except Rejected as exc:
+        for idx, _, _ in pending:
+            results[idx] = {"error": str(exc), "status": exc.status}
+        return results
+    except (ArtifactError, WorkerError) as exc:
+        for idx, _, _ in pending:
+            results[idx] = {"error": str(exc), "status": 500}
+        return results
+
+    for (idx, company_key, days), path in zip(pending, paths):
+        company_risk_value, country_grsi_value = forecasting.risk_join(company_key, company_risk_df, country_grsi_df)
+        result = build_result(company_key, path[:days], existing_plot(company_key), company_risk_value, country_grsi_value)
+        audit(result, days, "global-batch")
+        results[idx] = dict(result, status=200)
+    return results
+
+
+# ------------------------
+# Predict endpoint
+# ------------------------
+@app.route("/predict", methods=["POST"])
+@profiled("predict")
+def predict():
+    try:
+        payload, status, headers = predict_one(request.get_json() or {}, Deadline(REQUEST_DEADLINE))
+        response = jsonify(payload)
+        response.headers.update(headers)
+        return response, status
 
 
-        seq_length = 60
-        if len(data_scaled) < seq_length + 1:
-            return jsonify({"error": f"Not enough historical data for {company_key} (need > {seq_length})"}), 500
+    except Exception:
+        logging.error("Unhandled error in /predict:\n" + traceback.format_exc())
+        return jsonify({"error": "Unexpected error occurred"}), 500
 
 
-        # Build X,y
-        X, y = [], []
-        for i in range(seq_length, len(data_scaled)):
-            X.append(data_scaled[i - seq_length:i])
-            y.append(data_scaled[i, 0])
-        X = np.array(X)
-        y = np.array(y)
+# ------------------------
+# Batch predict: {"requests": [{"company", "days"}, ...]} -> {"results": [...]} in the same order,
+# each result carrying its own "status"
+# ------------------------
+MAX_BATCH = int(os.environ.get("MAX_BATCH", 50))
+# one deadline for the whole batch (0 disables); a caller's X-Deadline header (the router
+# sends one below its read timeout) can only shorten it
+BATCH_DEADLINE = float(os.environ.get("BATCH_DEADLINE", 50))
 
 
-        # Predictions
-        preds = model.predict(X, verbose=0)
+def batch_seconds(header):
+    seconds = BATCH_DEADLINE
+    try:
+        requested = float(header) if header else 0.0
+    except ValueError:
+        requested = 0.0
+    if requested > 0:
+        seconds = min(seconds, requested) if seconds else requested
+    return seconds
 
 
-        # preds might be shape (n,1) or (n,)
-        preds_arr = preds.reshape(-1, 1) if preds.ndim == 1 else preds
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    try:
+        items = (request.get_json(silent=True) or {}).get("requests")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Expected {\"requests\": [{\"company\": ..., \"days\": ...}, ...]}"}), 400
+        if len(items) > MAX_BATCH:
+            return jsonify({"error": f"At most {MAX_BATCH} requests per batch"}), 400
 
+        deadline = Deadline(batch_seconds(request.headers.get("X-Deadline")))
+        return jsonify({"results": predict_many(items, lambda: deadline)})
 
-        # Prepare for inverse_transform: pad with zeros for remaining features
-        n_features = data_scaled.shape[1]
-        if n_features < 1:
-            return jsonify({"error": "Dataset has no features"}), 500
 
+    except Exception:
+        logging.error("Unhandled error in /predict_batch:\n" + traceback.format_exc())
+        return jsonify({"error": "Unexpected error occurred"}), 500
 
-        pad_width_pred = np.zeros((preds_arr.shape[0], max(0, n_features - preds_arr.shape[1])))
-        preds_padded = np.concatenate([preds_arr, pad_width_pred], axis=1) if n_features > preds_arr.shape[1] else preds_arr[:, :n_features]
 
+# ------------------------
+# What-if scenarios: perturbations of the last input window, all rolled out as one batch.
+# {"company", "days", "scenarios": [{"name", "close_gap", "volatility", "grsi_stress"}, ...]}
+# or {"company", "days", "grid": {"close_gap": [-0.05, 0], "volatility": [1, 2]}}
+# ------------------------
+MAX_SCENARIOS = int(os.environ.get("MAX_SCENARIOS", 64))
+
+
+def grsi_norm(company_key):
+    # company GRSI relative to the riskiest company in company_risk.csv (0..1)
+    company_risk_value, _ = forecasting.risk_join(company_key, company_risk_df, country_grsi_df)
+    if company_risk_value is None or "grsi" not in company_risk_df.columns:
+        return 0.0
+    top = float(company_risk_df["grsi"].max())
+    return company_risk_value / top if top > 0 else 0.0
+
+
+@app.route("/scenario", methods=["POST"])
+def scenario():
+    try:
+        deadline = Deadline(REQUEST_DEADLINE)
+        data = request.get_json(silent=True) or {}
+        company_key = forecasting.match_company_key(str(data.get("company") or ""), models)
+        if company_key is None:
+            return jsonify({"error": f"Invalid company. Available: {list(models.keys())}"}), 400
+        try:
+            days = int(data.get("days", 5))
+        except (TypeError, ValueError):
+            return jsonify({"error": "days must be an integer"}), 400
+        if not 1 <= days <= MAX_FORECAST_DAYS:
+            return jsonify({"error": f"days must be between 1 and {MAX_FORECAST_DAYS}"}), 400
+
+        grid = data.get("grid") if isinstance(data.get("grid"), dict) else {}
+        listed = data.get("scenarios") if isinstance(data.get("scenarios"), list) else []
+        # sized from the list lengths, so an oversized grid is rejected before it is expanded
+        if 1 + len(listed) + (scenarios.grid_size(grid) if grid else 0) > MAX_SCENARIOS:
+            return jsonify({"error": f"At most {MAX_SCENARIOS} scenarios per request"}), 400
+        variants = [{}] + [s for s in listed if isinstance(s, dict)] + (scenarios.expand_grid(grid) if grid else [])
+        try:
+            variants = scenarios.validate(variants)
+        except (TypeError, ValueError) as exc:
+            return jsonify({"error": f"Invalid scenario: {exc}"}), 400
 
         try:
-            preds_rescaled = scaler.inverse_transform(preds_padded)[:, 0]
-        except Exception:
-            logging.error("Scaler inverse_transform failed:\n" + traceback.format_exc())
-            return jsonify({"error": "Scaler inverse_transform failed"}), 500
+            with admission.slot(deadline):
+                feed = ingest_hub.feed(company_key)
+                window = feed.snapshot()[0] if feed is not None else None
+                if worker_pool is not None:
+                    # same thread budget as /predict: the rollout runs on the ticker's worker
+                    result = worker_pool.run_scenarios(company_key, days, window, variants,
+                                                       grsi_norm(company_key), deadline)
+                else:
+                    model, scaler, data_scaled = load_artifacts(company_key)
+                    window = window if window is not None else data_scaled[-forecasting.SEQ_LENGTH:]
+                    result = scenarios.run_scenarios(model, scaler, window, days, variants,
+                                                     grsi_norm(company_key), deadline)
+        except Rejected as exc:
+            response = jsonify({"error": str(exc)})
+            response.headers["Retry-After"] = str(exc.retry_after)
+            return response, exc.status
+        except (ArtifactError, WorkerError) as exc:
+            return jsonify({"error": str(exc)}), 500
+
+        return jsonify(dict(result, company=company_key, days=days))
+
+
+    except Exception:
+        logging.error("Unhandled error in /scenario:\n" + traceback.format_exc())
+        return jsonify({"error": "Unexpected error occurred"}), 500
 
 
-        # Rescale y (actual)
-        y_arr = y.reshape(-1, 1)
-        pad_y = np.zeros((y_arr.shape[0], max(0, n_features - 1)))
-        y_padded = np.concatenate([y_arr, pad_y], axis=1)
+# ------------------------
+# Portfolio: {"holdings": [{"company": "Sony", "weight": 0.6}, ...], "days": 30, "investment": 10000}
+# ------------------------
+def forecast_paths(company_keys, days, deadline):
+    # forecast only (no backtest); one batch on the global model, else fanned out over the
+    # worker pool when enabled
+    if global_model is not None and all(key in global_model for key in company_keys):
+        return global_forecasts(company_keys, days, deadline)
+    windows = {}
+    for key in company_keys:
+        feed = ingest_hub.feed(key)
+        windows[key] = feed.snapshot()[0] if feed is not None else None
+    if worker_pool is not None:
+        outs = worker_pool.run_many([(key, days, windows[key]) for key in company_keys], deadline)
+        return [out["forecast"] for out in outs]
+    paths = []
+    for key in company_keys:
+        model, scaler, data_scaled = load_artifacts(key)
         try:
-            y_rescaled = scaler.inverse_transform(y_padded)[:, 0]
-        except Exception:
-            logging.error("Scaler inverse_transform failed for y:\n" + traceback.format_exc())
-            return jsonify({"error": "Scaler inverse_transform failed"}), 500
+            out = forecasting.forecast_series(model, scaler, data_scaled, days, windows[key], deadline=deadline,
+                                              with_backtest=False)
+        except forecasting.ForecastError as exc:
+            raise ArtifactError(f"{key}: {exc}")
+        paths.append(out["forecast"])
+    return paths
+
 
+@app.route("/portfolio", methods=["POST"])
+def get_portfolio():
+    try:
+        deadline = Deadline(REQUEST_DEADLINE)
+        data = request.get_json(silent=True) or {}
+        holdings = data.get("holdings")
+        if not isinstance(holdings, list) or not holdings:
+            return jsonify({"error": "Expected holdings: [{\"company\": ..., \"weight\": ...}, ...]"}), 400
+        try:
+            days = int(data.get("days", 5))
+            investment = float(data.get("investment", 1.0))
+            weights = [float(h.get("weight", 1.0)) for h in holdings]
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"error": "days, investment and weights must be numbers"}), 400
+        if not 1 <= days <= MAX_FORECAST_DAYS:
+            return jsonify({"error": f"days must be between 1 and {MAX_FORECAST_DAYS}"}), 400
+        if not math.isfinite(investment) or investment <= 0:
+            return jsonify({"error": "investment must be a positive number"}), 400
+
+        company_keys = [forecasting.match_company_key(str(h.get("company") or ""), models) for h in holdings]
+        unknown = [h.get("company") for h, key in zip(holdings, company_keys) if key is None]
+        if unknown:
+            return jsonify({"error": f"Invalid companies {unknown}. Available: {list(models.keys())}"}), 400
+        if len(set(company_keys)) != len(company_keys):
+            return jsonify({"error": "Each company may appear only once"}), 400
 
-        # Save plot
         try:
-            plt.figure(figsize=(10, 6))
-            plt.plot(y_rescaled[-100:], label="Actual Prices", linewidth=2)
-            plt.plot(preds_rescaled[-100:], label="Predicted Prices", linestyle="--", linewidth=2)
-            plt.title(f"Actual vs Predicted Stock Prices ({company_key})")
-            plt.xlabel("Days")
-            plt.ylabel("Stock Price")
-            plt.legend()
-            plt.grid(True)
-            plt.tight_layout()
-            plot_filename = f"{company_key}_actual_vs_predicted.png"
-            plot_path = os.path.join(PLOTS_DIR, plot_filename)
-            plt.savefig(plot_path)
-            plt.close()
-            plot_url = f"http://127.0.0.1:5000/plots/{plot_filename}"
-        except Exception:
-            logging.error("Failed to create/save plot:\n" + traceback.format_exc())
-            plot_url = None
-
-
-        # Forecast future days (iterative)
-        last_seq = data_scaled[-seq_length:]
-        current_input = last_seq.reshape(1, seq_length, -1)
-        forecast = []
-        for _ in range(days):
-            pred = model.predict(current_input, verbose=0)
-            val = float(pred[0][0]) if hasattr(pred, "shape") else float(pred[0])
-            forecast.append(val)
-            # create new input: drop first, append padded pred
-            new_row = np.concatenate((np.array([[val]]), np.zeros((1, n_features - 1))), axis=1) if n_features > 1 else np.array([[val]])
-            new_input = np.vstack([current_input[0][1:], new_row])
-            current_input = new_input.reshape(1, seq_length, -1)
-
-
-        # inverse transform forecast
-        forecast_arr = np.array(forecast).reshape(-1, 1)
-        pad_fore = np.zeros((forecast_arr.shape[0], max(0, n_features - 1)))
-        forecast_padded = np.concatenate([forecast_arr, pad_fore], axis=1)
+            with admission.slot(deadline):
+                histories, last_close = [], []
+                for key in company_keys:
+                    _, scaler, data_scaled = load_artifacts(key, with_model=False)
+                    history = forecasting.inverse_close(scaler, data_scaled[:, 0], data_scaled.shape[1])
+                    feed = ingest_hub.feed(key)
+                    histories.append(history)
+                    last_close.append(feed.closes[-1] if feed is not None else history[-1])
+                paths = forecast_paths(company_keys, days, deadline)
+        except Rejected as exc:
+            response = jsonify({"error": str(exc)})
+            response.headers["Retry-After"] = str(exc.retry_after)
+            return response, exc.status
+        except (ArtifactError, WorkerError) as exc:
+            return jsonify({"error": str(exc)}), 500
+
+        risks = [forecasting.risk_join(key, company_risk_df, country_grsi_df) for key in company_keys]
         try:
-            forecast_rescaled = scaler.inverse_transform(forecast_padded)[:, 0]
-        except Exception:
-            logging.error("Scaler inverse_transform failed for forecast:\n" + traceback.format_exc())
-            return jsonify({"error": "Scaler inverse_transform failed for forecast"}), 500
-
-
-        # GeoRisk lookup (company risk and country GRSI)
-        company_row = find_company_row(company_key)
-        company_risk_value = None
-        country_grsi_value = None
-        if not company_row.empty:
-            if "grsi" in company_row.columns:
-                company_risk_value = float(company_row.iloc[0]["grsi"])
-            if "country" in company_row.columns:
-                comp_country = company_row.iloc[0]["country"]
-                # find country GRSI
-                if not country_grsi_df.empty and "country" in country_grsi_df.columns and "grsi" in country_grsi_df.columns:
-                    country_row = country_grsi_df[country_grsi_df["country"].str.lower() == str(comp_country).lower()]
-                    if not country_row.empty:
-                        country_grsi_value = float(country_row.iloc[0]["grsi"])
-
-
-        result = {
-            "company": company_key,
-            "low_likely": float(min(forecast_rescaled)),
-            "high_likely": float(max(forecast_rescaled)),
-            "forecast": forecast_rescaled.tolist(),
-            "plot_url": plot_url,
-            "company_risk": company_risk_value,
-            "country_grsi": country_grsi_value,
-        }
-
-
-        return jsonify(result)
+            result = portfolio.aggregate(company_keys, weights, paths, last_close, histories,
+                                         [r[0] for r in risks], [r[1] for r in risks], investment)
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+        return jsonify(dict(result, days=days))
 
 
     except Exception:
-        logging.error("Unhandled error in /predict:\n" + traceback.format_exc())
+        logging.error("Unhandled error in /portfolio:\n" + traceback.format_exc())
         return jsonify({"error": "Unexpected error occurred"}), 500
 
 
+# ------------------------
+# Ingest endpoint: one bar or a list of bars {company, timestamp, open, high, low, close, volume}
+# ------------------------
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    # bars change what every client is served: admin-only, like /admin/* and PUT /shard
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    bars = request.get_json(silent=True)
+    if isinstance(bars, dict):
+        bars = [bars]
+    if not isinstance(bars, list) or not bars:
+        return jsonify({"error": "Expected a bar object or a list of bars"}), 400
+
+    accepted, errors = {}, []
+    for bar in bars:
+        try:
+            if not isinstance(bar, dict) or bar.get("close") is None:
+                raise ValueError("bar needs company and close")
+            company_key, version = ingest_bar(bar)
+            accepted[company_key] = version
+        except (ArtifactError, KeyError, TypeError, ValueError) as exc:
+            errors.append({"bar": bar, "error": str(exc)})
+    status = 200 if accepted else 400
+    return jsonify({"accepted": accepted, "errors": errors}), status
+
+
+@app.route("/ingest", methods=["GET"])
+def ingest_status():
+    return jsonify(ingest_hub.status())
+
+
+# ------------------------
+# Shard info (polled by the router's health check)
+# ------------------------
+@app.route("/shard", methods=["GET"])
+def get_shard():
+    return jsonify({"companies": list(models.keys()), "available": list(forecasting.MODELS.keys()),
+                    "sharded": len(models) < len(forecasting.MODELS), "pid": os.getpid()})
+
+
+shard_lock = threading.Lock()
+
+
+@app.route("/shard", methods=["PUT"])
+def set_shard():
+    # router-assigned tickers: a new dict is swapped in (readers keep iterating the old one)
+    # and dropped tickers are evicted from the workers, the live feeds and the forecast cache
+    global models
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    companies = (request.get_json(silent=True) or {}).get("companies")
+    if not isinstance(companies, list):
+        return jsonify({"error": "Expected {\"companies\": [...]}"}), 400
+    unknown = [c for c in companies if c not in forecasting.MODELS]
+    if unknown:
+        return jsonify({"error": f"Unknown companies {unknown}"}), 400
+    with shard_lock:
+        removed = [k for k in models if k not in companies]
+        models = {k: v for k, v in forecasting.MODELS.items() if k in companies}
+    for company_key in removed:
+        ingest_hub.remove(company_key)
+        live_forecasts.invalidate(company_key)
+    if worker_pool is not None and removed:
+        worker_pool.evict(removed)
+    logging.info(f"Shard reassigned: {list(models.keys())} (dropped {removed})")
+    return get_shard()
+
+
+# ------------------------
+# Admission / worker stats
+# ------------------------
+@app.route("/admission", methods=["GET"])
+def get_admission():
+    return jsonify(dict(admission.stats(), max_forecast_days=MAX_FORECAST_DAYS, request_deadline=REQUEST_DEADLINE,
+                        single_flight=single_flight.stats() if single_flight is not None else None))
+
+
+@app.route("/workers", methods=["GET"])
+def get_workers():
+    if worker_pool is None:
+        return jsonify({"workers": 0, "threads_per_worker": INFERENCE_THREADS, "cpu_count": os.cpu_count()})
+    return jsonify(worker_pool.stats())
+
+
+# ------------------------
+# Audit log stats
+# ------------------------
+@app.route("/audit", methods=["GET"])
+def get_audit():
+    if audit_log is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(audit_log.stats(), enabled=True))
+
+
+# ------------------------
+# Memory: process / children RSS, Python heap, TF allocator, per-ticker attribution
+# ------------------------
+@app.route("/admin/memory", methods=["GET"])
+def get_memory():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    tickers = ticker_memory.report()
+    for company_key in models:
+        feed = ingest_hub.feed(company_key)
+        cached = live_forecasts.entries.get(company_key)
+        retained = (feed.buffer.rows.nbytes if feed is not None else 0) + (cached[1].nbytes if cached else 0)
+        if retained:
+            tickers.setdefault(company_key, {})["retained_mb"] = memory.mb(retained)
+
+    workers = None
+    if worker_pool is not None:
+        workers = [{"pid": w["pid"], "rss_mb": memory.mb(memory.rss_bytes(w["pid"])), "tickers": w["tickers"]}
+                   for w in worker_pool.stats()["per_worker"]]
+    return jsonify({
+        "pid": os.getpid(),
+        "rss_mb": memory.mb(memory.rss_bytes()),
+        "children": [{"pid": pid, "rss_mb": memory.mb(memory.rss_bytes(pid))} for pid in memory.child_pids()],
+        "python_heap": memory.heap_stats(request.args.get("top", 10, type=int)),
+        "tf_allocator": memory.tf_allocator_stats(),
+        "tickers": tickers,
+        "workers": workers,
+    })
+
+
+# ------------------------
+# Profiles: list / fetch / toggle sampling
+# ------------------------
+@app.route("/admin/profiles", methods=["GET"])
+def list_profiles():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"settings": profiler.settings(), "profiles": profiler.list()})
+
+
+@app.route("/admin/profiles/<name>", methods=["GET"])
+def get_profile(name):
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    path = profiler.path(name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(os.path.abspath(profiler.directory), name, as_attachment=True)
+
+
+@app.route("/admin/profiling", methods=["POST"])
+def set_profiling():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        settings = profiler.configure(data.get("enabled"), data.get("sample_rate"), data.get("mode"),
+                                      data.get("max_per_minute"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "sample_rate and max_per_minute must be numbers"}), 400
+    return jsonify(settings)
+
+
 # ------------------------
 # Serve plot images
 # ------------------------
@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+import traceback
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, FileResponse
+from starlette.routing import Route, Mount
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # Starlette's own (deprecated) adapter
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.admission import Deadline
+
+# backend/app.py owns all state (models, store, pack, admission, worker pool, risk tables)
+import app as core
+
+
+# ------------------------
+# ASGI serving mode: uvicorn app_asgi:app --port 5000 (from backend/)
+#   - /, /grsi, /company_risk, /country_GRSI, /plots/<file> are answered on the event loop
+#   - /predict and /predict_batch run in an executor sized to the admission limits, so
+#     excess requests get 429/503 from admission control instead of queueing unseen;
+#     a client disconnect cancels the request's deadline, which stops the rollout
+#   - every other route is the Flask app, mounted as WSGI
+# ------------------------
+EXECUTOR_THREADS = int(os.environ.get("ASGI_INFERENCE_THREADS",
+                                      core.admission.max_concurrent + core.admission.max_queue))
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_THREADS, thread_name_prefix="inference")
+
+
+class JSON(JSONResponse):
+    # same encoding as Flask's jsonify (NaN in the risk tables stays NaN)
+    def render(self, content):
+        return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+# ------------------------
+# Cancellation: deadlines handed to the worker thread; cancel() expires them all
+# ------------------------
+class Cancellation:
+    def __init__(self):
+        self.cancelled = False
+        self.deadlines = []
+
+    def deadline(self, seconds=None):
+        deadline = Deadline(core.REQUEST_DEADLINE if seconds is None else seconds)
+        if self.cancelled:
+            deadline.cancel()
+        self.deadlines.append(deadline)
+        return deadline
+
+    def cancel(self):
+        self.cancelled = True
+        for deadline in self.deadlines:
+            deadline.cancel()
+
+
+async def wait_disconnect(request):
+    # the body has been read, so the next ASGI message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def offload(request, name, fn, *args):
+    # runs fn(*args) on the executor; returns (result, profile filename or None), or
+    # (None, None) when the client disconnected first
+    forced = request.headers.get("X-Profile") == "1" and core.admin_allowed(
+        request.headers.get("X-Admin-Token"), request.client.host if request.client else None)
+    if core.profiler.wanted(forced):
+        work = asyncio.get_running_loop().run_in_executor(executor, lambda: core.profiler.run(name, fn, *args))
+    else:
+        work = asyncio.get_running_loop().run_in_executor(executor, lambda: (fn(*args), None))
+    watch = asyncio.ensure_future(wait_disconnect(request))
+    try:
+        await asyncio.wait({work, watch}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watch.cancel()
+    if work.done():
+        return work.result()
+    return None, None
+
+
+def disconnected(cancellation, path):
+    # the thread stops at its next deadline check and frees its admission slot
+    cancellation.cancel()
+    logging.info(f"Client disconnected from {path}; request cancelled")
+    return JSON({"error": "Client disconnected"}, status_code=499)
+
+
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data
+
+
+# ------------------------
+# Event-loop routes (no inference)
+# ------------------------
+async def home(request):
+    return JSON({"message": "Backend running (ASGI). Use /predict and /grsi endpoints."})
+
+
+async def get_company_risk(request):
+    try:
+        return JSON(core.company_risk_df.to_dict(orient="records"))
+    except Exception:
+        logging.error(traceback.format_exc())
+        return JSON({"error": "Failed to return company risk data"}, status_code=500)
+
+
+async def get_country_grsi(request):
+    try:
+        return JSON(core.country_grsi_df.to_dict(orient="records"))
+    except Exception:
+        logging.error(traceback.format_exc())
+        return JSON({"error": "Failed to return country GRSI data"}, status_code=500)
+
+
+async def get_grsi(request):
+    try:
+        payload, status = core.grsi_lookup(request.query_params.get("company"))
+        return JSON(payload, status_code=status)
+    except Exception:
+        logging.error(traceback.format_exc())
+        return JSON({"error": "Unexpected server error"}, status_code=500)
+
+
+async def get_plot(request):
+    filename = request.path_params["filename"]
+    path = os.path.join(os.getcwd(), core.PLOTS_DIR, filename)
+    if os.path.basename(filename) != filename or not os.path.isfile(path):
+        return JSON({"error": "Plot not found"}, status_code=404)
+    # file body is streamed from a thread, off the event loop
+    return FileResponse(path)
+
+
+# ------------------------
+# Inference routes (executor, cancelled on disconnect)
+# ------------------------
+async def predict(request):
+    try:
+        data = await read_json(request)
+        data = data if isinstance(data, dict) else {}
+        cancellation = Cancellation()
+        label = core.profile_label("predict", data.get("company"), data.get("days"))
+        result, profile = await offload(request, label, core.predict_one, data, cancellation.deadline())
+        if result is None:
+            return disconnected(cancellation, "/predict")
+        payload, status, headers = result
+        response = JSON(payload, status_code=status, headers=headers)
+        if profile:
+            response.headers["X-Profile"] = profile
+        return response
+    except Exception:
+        logging.error("Unhandled error in /predict:\n" + traceback.format_exc())
+        return JSON({"error": "Unexpected error occurred"}, status_code=500)
+
+
+async def predict_batch(request):
+    try:
+        data = await read_json(request)
+        items = data.get("requests") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return JSON({"error": "Expected {\"requests\": [{\"company\": ..., \"days\": ...}, ...]}"}, status_code=400)
+        if len(items) > core.MAX_BATCH:
+            return JSON({"error": f"At most {core.MAX_BATCH} requests per batch"}, status_code=400)
+
+        cancellation = Cancellation()
+        # one deadline for the whole batch, as in the Flask route
+        deadline = cancellation.deadline(core.batch_seconds(request.headers.get("X-Deadline")))
+        results, _ = await offload(request, "predict_batch", core.predict_many, items, lambda: deadline)
+        if results is None:
+            return disconnected(cancellation, "/predict_batch")
+        return JSON({"results": results})
+    except Exception:
+        logging.error("Unhandled error in /predict_batch:\n" + traceback.format_exc())
+        return JSON({"error": "Unexpected error occurred"}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/", home, methods=["GET"]),
+        Route("/company_risk", get_company_risk, methods=["GET"]),
+        Route("/country_GRSI", get_country_grsi, methods=["GET"]),
+        Route("/grsi", get_grsi, methods=["GET"]),
+        Route("/plots/{filename}", get_plot, methods=["GET"]),
+        Route("/predict", predict, methods=["POST"]),
+        Route("/predict_batch", predict_batch, methods=["POST"]),
+        # /scenario, /portfolio, /ingest, /admin/*, /admission, /workers, /shard
+        Mount("/", app=WSGIMiddleware(core.app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+
+def serve(host="127.0.0.1", port=5000):
+    import uvicorn
+
+    uvicorn.run(app, host=host, port=port, log_level="info")
+
+
+# ------------------------
+# Run app
+# ------------------------
+if __name__ == "__main__":
+    logging.info("Starting ASGI backend on http://127.0.0.1:5000")
+    serve(port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,422 @@
+import os
+import sys
+import hmac
+import json
+import time
+import logging
+import itertools
+import threading
+import traceback
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import forecasting
+from utils.sharding import HashRing
+
+
+# ------------------------
+# App / Logging setup
+# ------------------------
+app = Flask(__name__)
+CORS(app)
+logging.basicConfig(level=logging.INFO)
+
+
+# ------------------------
+# Nodes: ROUTER_NODES="http://127.0.0.1:5101,http://127.0.0.1:5102"
+# ------------------------
+NODES = [n.strip().rstrip("/") for n in os.environ.get("ROUTER_NODES", "").split(",") if n.strip()]
+HEALTH_INTERVAL = float(os.environ.get("ROUTER_HEALTH_INTERVAL", 2))
+NODE_TIMEOUT = float(os.environ.get("ROUTER_NODE_TIMEOUT", 60))
+PASS_HEADERS = ("Retry-After", "X-Forecast-Source")
+# nodes reject /predict_batch bodies above their MAX_BATCH: groups are split to fit
+NODE_MAX_BATCH = int(os.environ.get("MAX_BATCH", 50))
+ROUTER_MAX_BATCH = int(os.environ.get("ROUTER_MAX_BATCH", 500))
+# 0: nodes keep their own SHARD_TICKERS (static replication, failover only);
+# N > 0: the router assigns every ticker to its N ring successors and pushes the
+# assignment to the nodes (PUT /shard) whenever membership changes
+REPLICAS = int(os.environ.get("ROUTER_REPLICAS", 0))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# nodes get a /predict_batch deadline (X-Deadline) that ends before the router stops reading
+BATCH_DEADLINE = NODE_TIMEOUT * 0.9
+LOOPBACK = ("127.0.0.1", "::1")
+
+ring = HashRing()
+node_state = {}
+assignments = {}
+state_lock = threading.Lock()
+fanout = ThreadPoolExecutor(max_workers=int(os.environ.get("ROUTER_FANOUT", 16)))
+round_robin = itertools.count()
+
+
+# ------------------------
+# HTTP helper: returns (status, body bytes, headers); raises OSError when the node is
+# unreachable and NodeTimeout when it accepted the request but did not answer in time
+# (busy, not down: callers do not take it out of the ring)
+# ------------------------
+class NodeTimeout(Exception):
+    pass
+
+
+def forward(method, url, body=None, timeout=NODE_TIMEOUT, headers=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers=dict({"Content-Type": "application/json"}, **(headers or {})))
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read(), dict(resp.headers)
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read(), dict(exc.headers)
+    except urllib.error.URLError as exc:
+        if isinstance(exc.reason, TimeoutError):
+            raise NodeTimeout(f"{url} timed out")
+        raise OSError(str(exc.reason))
+    except TimeoutError:
+        raise NodeTimeout(f"{url} timed out")
+
+
+# ------------------------
+# Membership + health checks: the ring only contains healthy nodes. A node leaving
+# (or failing) sends its tickers to the next ring successors that serve them; with
+# ROUTER_REPLICAS, rebalance() also moves ticker ownership, and only the tickers
+# next to the joining/leaving node change hands
+# ------------------------
+def mark(url, healthy, companies=None, available=None):
+    # returns True when ring membership changed
+    with state_lock:
+        state = node_state.setdefault(url, {"healthy": False, "companies": [], "available": [], "failures": 0})
+        was_healthy = state["healthy"]
+        state["healthy"] = healthy
+        state["last_check"] = time.time()
+        state["failures"] = 0 if healthy else state["failures"] + 1
+        if companies is not None:
+            state["companies"] = companies
+        if available is not None:
+            state["available"] = available
+        if healthy and not was_healthy:
+            ring.add(url)
+            logging.info(f"Node joined: {url} ({len(state['companies'])} tickers)")
+        elif not healthy and was_healthy:
+            ring.remove(url)
+            logging.warning(f"Node left: {url}")
+        else:
+            return False
+    if REPLICAS:
+        rebalance()
+    return True
+
+
+def rebalance():
+    # each ticker any node can serve goes to its REPLICAS ring successors; nodes gaining
+    # tickers are updated before nodes losing them, so a moving ticker always has a server
+    with state_lock:
+        universe = sorted({c for url in ring.nodes for c in node_state[url]["available"]})
+        plan = {url: [] for url in ring.nodes}
+        for company in universe:
+            for url in ring.nodes_for(company, REPLICAS):
+                plan[url].append(company)
+        assignments.clear()
+        assignments.update(plan)
+        changes = [(url, companies, bool(set(companies) - set(node_state[url]["companies"])))
+                   for url, companies in plan.items() if set(companies) != set(node_state[url]["companies"])]
+    for url, companies, _ in sorted(changes, key=lambda change: not change[2]):
+        assign_node(url, companies)
+
+
+def assign_node(url, companies):
+    try:
+        status, body, _ = forward("PUT", f"{url}/shard", {"companies": companies}, timeout=5,
+                                  headers={"X-Admin-Token": ADMIN_TOKEN} if ADMIN_TOKEN else None)
+        if status != 200:
+            raise OSError(f"status {status}")
+        with state_lock:
+            if url in node_state:
+                node_state[url]["companies"] = json.loads(body).get("companies", [])
+        logging.info(f"Assigned {len(companies)} tickers to {url}")
+    except (OSError, ValueError, NodeTimeout) as exc:
+        logging.warning(f"Could not assign tickers to {url}: {exc}")
+
+
+def check_node(url):
+    try:
+        status, body, _ = forward("GET", f"{url}/shard", timeout=2)
+        if status != 200:
+            raise OSError(f"status {status}")
+        shard = json.loads(body)
+        changed = mark(url, True, shard.get("companies", []), shard.get("available", []))
+    except (OSError, ValueError, NodeTimeout):
+        mark(url, False)
+        return
+    # a restarted node comes back with its own SHARD_TICKERS: give it its assignment again
+    if REPLICAS and not changed and url in assignments and set(assignments[url]) != set(shard.get("companies", [])):
+        assign_node(url, assignments[url])
+
+
+def health_loop():
+    while True:
+        with state_lock:
+            urls = list(node_state)
+        for url in urls:
+            check_node(url)
+        time.sleep(HEALTH_INTERVAL)
+
+
+def add_node(url):
+    with state_lock:
+        node_state.setdefault(url, {"healthy": False, "companies": [], "available": [], "failures": 0})
+    check_node(url)
+
+
+def remove_node(url):
+    with state_lock:
+        node_state.pop(url, None)
+        ring.remove(url)
+    if REPLICAS:
+        rebalance()
+
+
+for node_url in NODES:
+    add_node(node_url)
+threading.Thread(target=health_loop, name="router-health", daemon=True).start()
+
+
+# ------------------------
+# Routing: walk the ring from the company's hash, keep nodes that serve it
+# ------------------------
+def candidates(company):
+    with state_lock:
+        owners = ring.walk(company)
+        return [url for url in owners
+                if forecasting.match_company_key(company, node_state[url]["companies"]) is not None]
+
+
+def healthy_nodes():
+    with state_lock:
+        return [url for url, state in node_state.items() if state["healthy"]]
+
+
+def to_response(status, body, headers, node):
+    response = Response(body, status=status, content_type=headers.get("Content-Type", "application/json"))
+    for name in PASS_HEADERS:
+        if name in headers:
+            response.headers[name] = headers[name]
+    response.headers["X-Shard-Node"] = node
+    return response
+
+
+def unavailable(message):
+    response = jsonify({"error": message})
+    response.headers["Retry-After"] = str(int(HEALTH_INTERVAL) + 1)
+    return response, 503
+
+
+def route(method, company, path, body=None):
+    # try owners in ring order; an unreachable node is marked down and the next one is used
+    for url in candidates(company):
+        try:
+            return url, forward(method, f"{url}{path}", body)
+        except NodeTimeout:
+            logging.warning(f"Node {url} timed out for {company}")
+            return url, (504, json.dumps({"error": "Shard timed out"}).encode("utf-8"), {})
+        except OSError:
+            logging.warning(f"Node {url} unreachable for {company}; failing over")
+            mark(url, False)
+    return None, None
+
+
+def chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# ------------------------
+# Health check
+# ------------------------
+@app.route("/", methods=["GET"])
+def home():
+    return jsonify({"message": "Router running. Use /predict, /predict_batch and /nodes.",
+                    "healthy_nodes": len(healthy_nodes())})
+
+
+# ------------------------
+# Predict (single company -> owning shard)
+# ------------------------
+@app.route("/predict", methods=["POST"])
+def predict():
+    try:
+        data = request.get_json(silent=True) or {}
+        company = data.get("company")
+        if not company:
+            return jsonify({"error": "Company is required"}), 400
+        node, result = route("POST", str(company), "/predict", data)
+        if result is None:
+            return unavailable(f"No healthy node serves {company}")
+        return to_response(*result, node)
+    except Exception:
+        logging.error("Unhandled error in router /predict:\n" + traceback.format_exc())
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+
+# ------------------------
+# Batch predict: group by owning shard (split to the nodes' MAX_BATCH), fan out
+# concurrently, merge in request order. Only an unreachable node or a 5xx counts
+# as a node failure; a 4xx is the request's fault and is passed through per item,
+# and a timeout (busy node) fails just that chunk with 504, without re-routing it
+# ------------------------
+def run_group(url, indexed_items):
+    try:
+        status, body, _ = forward("POST", f"{url}/predict_batch", {"requests": [item for _, item in indexed_items]},
+                                  headers={"X-Deadline": f"{BATCH_DEADLINE:g}"})
+    except NodeTimeout:
+        logging.warning(f"Batch chunk on {url} timed out")
+        return [(idx, {"error": "Shard timed out", "status": 504}) for idx, _ in indexed_items]
+    if status >= 500:
+        raise OSError(f"{url} answered {status}")
+    if status != 200:
+        try:
+            error = json.loads(body).get("error")
+        except (ValueError, AttributeError):
+            error = body.decode("utf-8", errors="replace")
+        return [(idx, {"error": error, "status": status}) for idx, _ in indexed_items]
+    return [(idx, result) for (idx, _), result in zip(indexed_items, json.loads(body)["results"])]
+
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    try:
+        items = (request.get_json(silent=True) or {}).get("requests")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Expected {\"requests\": [{\"company\": ..., \"days\": ...}, ...]}"}), 400
+        if len(items) > ROUTER_MAX_BATCH:
+            return jsonify({"error": f"At most {ROUTER_MAX_BATCH} requests per batch"}), 400
+
+        results = [None] * len(items)
+        pending = list(enumerate(items))
+        # a failed group is re-routed once (its node is marked down in between)
+        for _ in range(2):
+            groups = {}
+            for idx, item in pending:
+                owners = candidates(str(item.get("company", ""))) if isinstance(item, dict) else []
+                if not owners:
+                    results[idx] = {"error": f"No healthy node serves {item.get('company') if isinstance(item, dict) else item}",
+                                    "status": 503}
+                    continue
+                groups.setdefault(owners[0], []).append((idx, item))
+
+            futures = [(url, chunk, fanout.submit(run_group, url, chunk))
+                       for url, group in groups.items() for chunk in chunks(group, NODE_MAX_BATCH)]
+            pending = []
+            for url, chunk, future in futures:
+                try:
+                    for idx, result in future.result():
+                        results[idx] = dict(result, node=url)
+                except (OSError, ValueError, KeyError):
+                    logging.warning(f"Batch group on {url} failed; re-routing")
+                    mark(url, False)
+                    pending.extend(chunk)
+            if not pending:
+                break
+        for idx, _ in pending:
+            results[idx] = {"error": "Shard unavailable", "status": 503}
+        return jsonify({"results": results})
+    except Exception:
+        logging.error("Unhandled error in router /predict_batch:\n" + traceback.format_exc())
+        return jsonify({"error": "Unexpected error occurred"}), 500
+
+
+# ------------------------
+# Metadata endpoints: any healthy node
+# ------------------------
+def any_node(path):
+    nodes = healthy_nodes()
+    for i in range(len(nodes)):
+        url = nodes[(next(round_robin) + i) % len(nodes)]
+        try:
+            return to_response(*forward("GET", f"{url}{path}"), url)
+        except NodeTimeout:
+            continue
+        except OSError:
+            mark(url, False)
+    return unavailable("No healthy nodes")
+
+
+@app.route("/grsi", methods=["GET"])
+def get_grsi():
+    query = urllib.parse.urlencode(request.args)
+    return any_node("/grsi" + (f"?{query}" if query else ""))
+
+
+@app.route("/company_risk", methods=["GET"])
+def get_company_risk():
+    return any_node("/company_risk")
+
+
+@app.route("/country_GRSI", methods=["GET"])
+def get_country_grsi():
+    return any_node("/country_GRSI")
+
+
+# ------------------------
+# Plots live on the node that rendered them: route by the company in the filename
+# ------------------------
+@app.route("/plots/<filename>")
+def get_plot(filename):
+    company = filename.rsplit("_actual_vs_predicted", 1)[0]
+    node, result = route("GET", company, f"/plots/{urllib.parse.quote(filename)}")
+    if result is None:
+        return unavailable(f"No healthy node serves {company}")
+    return to_response(*result, node)
+
+
+# ------------------------
+# Membership: list / join / leave
+# ------------------------
+@app.route("/nodes", methods=["GET"])
+def list_nodes():
+    with state_lock:
+        state = {url: dict(s) for url, s in node_state.items()}
+    companies = sorted({c for s in state.values() for c in s["companies"]})
+    owners = {company: (candidates(company) or [None])[0] for company in companies}
+    return jsonify({"nodes": state, "owners": owners})
+
+
+def is_admin():
+    # same rule as the nodes: ADMIN_TOKEN when set, otherwise loopback callers only
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get("X-Admin-Token") or "", ADMIN_TOKEN)
+    return request.remote_addr in LOOPBACK
+
+
+@app.route("/nodes", methods=["POST"])
+def join_node():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    url = ((request.get_json(silent=True) or {}).get("url") or "").rstrip("/")
+    if not url:
+        return jsonify({"error": "url is required"}), 400
+    add_node(url)
+    return jsonify({"url": url, **node_state.get(url, {})})
+
+
+@app.route("/nodes", methods=["DELETE"])
+def leave_node():
+    if not is_admin():
+        return jsonify({"error": "Forbidden"}), 403
+    url = ((request.get_json(silent=True) or {}).get("url") or "").rstrip("/")
+    if not url:
+        return jsonify({"error": "url is required"}), 400
+    remove_node(url)
+    return jsonify({"removed": url})
+
+
+# ------------------------
+# Run router
+# ------------------------
+if __name__ == "__main__":
+    logging.info(f"Starting router on http://127.0.0.1:5000 for {NODES}")
+    app.run(host="127.0.0.1", port=int(os.environ.get("ROUTER_PORT", 5000)), threaded=True)
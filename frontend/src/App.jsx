@@ -336,7 +336,7 @@ export default function App() {
             <div style={{ flex: "0 1 130px" }}>
               <label style={labelStyle}>Forecast Days</label>
               <input
-                type="number" min="1" max="101" value={days}
+                type="number" min="1" max="100" value={days}
                 style={selectStyle(accentFrom)}
                 onChange={(e) => setDays(e.target.value)}
               />
@@ -23,7 +23,7 @@ company = None
 if country:
     company = st.selectbox("Select Company", [""] + company_options[country])
 
-days = st.number_input("Days to Forecast", min_value=1, max_value=101, value=5)
+days = st.number_input("Days to Forecast", min_value=1, max_value=100, value=5)
 
 # -------------------- ACTION BUTTONS --------------------
 col1, col2 = st.columns(2)
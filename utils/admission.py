@@ -0,0 +1,211 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+
+# ------------------------
+# Errors surfaced to the HTTP layer
+# ------------------------
+class Rejected(Exception):
+    status = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class QueueFull(Rejected):
+    # wait queue is full -> client should back off
+    status = 429
+
+
+class QueueTimeout(Rejected):
+    # waited for a slot longer than allowed
+    status = 503
+
+
+class DeadlineExceeded(Rejected):
+    # request ran out of its time budget (checked cooperatively between model calls)
+    status = 503
+
+
+class Cancelled(Rejected):
+    # client went away (ASGI mode); nginx's "client closed request" status
+    status = 499
+
+
+# ------------------------
+# Per-request deadline (cancel() makes it expire now, e.g. on client disconnect)
+# ------------------------
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def remaining(self):
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.cancelled or (self.expires_at is not None and time.monotonic() >= self.expires_at)
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled("Request cancelled: client disconnected")
+        if self.expired():
+            raise DeadlineExceeded(f"Request deadline of {self.seconds}s exceeded")
+
+
+# ------------------------
+# Bounded concurrency with a bounded wait queue
+# ------------------------
+class AdmissionController:
+    def __init__(self, max_concurrent=2, max_queue=8, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.completed = 0
+        # smoothed service time, used to suggest Retry-After
+        self.avg_service = 1.0
+
+    def retry_after(self):
+        return self.avg_service * (self.waiting + 1) / self.max_concurrent
+
+    def acquire(self, deadline=None):
+        if deadline is not None:
+            deadline.check()
+        # a free slot is taken without queueing; only callers that must wait count against max_queue
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self.active += 1
+            return
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull("Inference queue is full", self.retry_after())
+            self.waiting += 1
+
+        timeout = self.queue_timeout
+        if deadline is not None and deadline.remaining() is not None:
+            timeout = min(timeout, deadline.remaining())
+        acquired = self._slots.acquire(timeout=timeout)
+
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timed_out += 1
+                raise QueueTimeout("Timed out waiting for an inference slot", self.retry_after())
+            self.active += 1
+
+    def release(self, service_time):
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            self.avg_service = 0.8 * self.avg_service + 0.2 * service_time
+        self._slots.release()
+
+    @contextmanager
+    def slot(self, deadline=None):
+        self.acquire(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_service_seconds": round(self.avg_service, 3),
+            }
+
+
+# ------------------------
+# Single-flight: concurrent calls with the same key share one execution. Followers
+# wait within their own deadline; a leader failing for its own request (deadline,
+# disconnect, queue rejection) hands the key to the next caller instead of failing
+# everyone, while any other error is shared with the waiting followers.
+# ------------------------
+# followers wake this often to check their deadline, so a disconnect (Deadline.cancel
+# from another thread) ends the wait without waiting for the leader
+WAIT_SLICE = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+        self.retried = 0
+
+    def do(self, key, fn, deadline=None):
+        # returns (result, shared)
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.executed += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                    return call.result, False
+                except BaseException as exc:
+                    call.error = exc
+                    raise
+                finally:
+                    with self._lock:
+                        self._calls.pop(key, None)
+                    call.done.set()
+
+            if deadline is None:
+                call.done.wait()
+            while not call.done.is_set():
+                deadline.check()
+                remaining = deadline.remaining()
+                call.done.wait(WAIT_SLICE if remaining is None else min(WAIT_SLICE, remaining))
+            if isinstance(call.error, Rejected):
+                with self._lock:
+                    self.retried += 1
+                continue
+            if call.error is not None:
+                raise call.error
+            with self._lock:
+                self.shared += 1
+            return call.result, True
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "executed": self.executed, "shared": self.shared,
+                    "retried": self.retried}
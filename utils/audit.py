@@ -0,0 +1,315 @@
+import io
+import os
+import json
+import time
+import atexit
+import struct
+import logging
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import forecasting
+from utils.ingest import read_bars
+
+
+# ------------------------
+# Append-only forecast audit log: records are buffered in memory and a background
+# thread appends them in batches as compressed columnar blocks. Each log file is
+#   b"SFAUDIT1" | frame | frame | ...      frame = uint64 length | npz block
+# with columns ts, origin, company, horizon, model_hash, source, offsets, values
+# (forecast paths flattened; record i is values[offsets[i]:offsets[i + 1]]). origin
+# is the as-of time of the forecast's input (the last live bar), NaN when the input
+# was the undated stored snapshot, store answers included. Files rotate by
+# size and day; the oldest beyond max_files are removed. A truncated last frame
+# (crash mid-write) is ignored by the reader.
+# ------------------------
+MAGIC = b"SFAUDIT1"
+FLUSH_INTERVAL = 5.0
+FLUSH_RECORDS = 1000
+MAX_BUFFER = 100_000
+ROTATE_BYTES = 64 * 1024 * 1024
+MAX_FILES = 100
+
+
+def to_epoch(timestamp):
+    # bar / feed timestamp -> seconds since the epoch; naive timestamps are taken as UTC
+    ts = pd.Timestamp(timestamp)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts
+    return ts.timestamp()
+
+
+def encode_block(records):
+    ts, origin, company, horizon, model_hash, source, values = zip(*records)
+    lengths = np.array([len(v) for v in values], dtype=np.int64)
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        ts=np.array(ts, dtype=np.float64),
+        origin=np.array([np.nan if o is None else o for o in origin], dtype=np.float64),
+        company=np.array(company, dtype=str),
+        horizon=np.array(horizon, dtype=np.int16),
+        model_hash=np.array(model_hash, dtype=str),
+        source=np.array(source, dtype=str),
+        offsets=np.concatenate([[0], np.cumsum(lengths)]),
+        values=np.concatenate(values).astype(np.float32),
+    )
+    return buf.getvalue()
+
+
+class AuditLog:
+    def __init__(self, directory, flush_interval=FLUSH_INTERVAL, flush_records=FLUSH_RECORDS,
+                 max_buffer=MAX_BUFFER, rotate_bytes=ROTATE_BYTES, max_files=MAX_FILES):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.max_buffer = max_buffer
+        self.rotate_bytes = rotate_bytes
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.file = None
+        self.file_day = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def record(self, company, horizon, model_hash, values, source="live", origin=None):
+        # request path: one list append under a lock, never file I/O
+        with self.lock:
+            if len(self.buffer) >= self.max_buffer:
+                self.dropped += 1
+                return False
+            self.buffer.append((time.time(), origin, company, int(horizon), model_hash or "",
+                                source, np.asarray(values, dtype=np.float32)))
+            self.recorded += 1
+            if len(self.buffer) >= self.flush_records:
+                self.wake.set()
+        return True
+
+    def _run(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Audit log flush failed")
+
+    def flush(self):
+        with self.lock:
+            records, self.buffer = self.buffer, []
+        if not records:
+            return 0
+        block = encode_block(records)
+        with self.write_lock:
+            f = self._target(len(block))
+            f.write(struct.pack("<Q", len(block)))
+            f.write(block)
+            f.flush()
+            self.written += len(records)
+            self.flushes += 1
+        return len(records)
+
+    def _target(self, size):
+        day = time.strftime("%Y%m%d")
+        if self.file is not None and (day != self.file_day or self.file.tell() + size > self.rotate_bytes):
+            self.file.close()
+            self.file = None
+        if self.file is None:
+            path = os.path.join(self.directory, f"forecasts-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.audit")
+            self.file = open(path, "ab")
+            if self.file.tell() == 0:
+                self.file.write(MAGIC)
+            self.file_day = day
+            self._prune()
+        return self.file
+
+    def _prune(self):
+        for name in log_files(self.directory)[:-self.max_files]:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wake.set()
+        self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+        with self.write_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def stats(self):
+        with self.lock:
+            buffered = len(self.buffer)
+        return {"directory": self.directory, "buffered": buffered, "recorded": self.recorded,
+                "written": self.written, "dropped": self.dropped, "flushes": self.flushes,
+                "files": len(log_files(self.directory))}
+
+
+# ------------------------
+# Reader
+# ------------------------
+def log_files(directory):
+    if not os.path.isdir(directory):
+        return []
+    # names sort chronologically
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".audit"))
+
+
+def read_blocks(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an audit log")
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                return
+            (size,) = struct.unpack("<Q", head)
+            data = f.read(size)
+            if len(data) < size:
+                logging.warning(f"{path}: truncated last block ignored")
+                return
+            with np.load(io.BytesIO(data)) as block:
+                yield {k: block[k] for k in block.files}
+
+
+def read_log(directory):
+    # yields one dict per record
+    for path in log_files(directory):
+        for block in read_blocks(path):
+            offsets = block["offsets"]
+            origin = block.get("origin", np.full(len(block["ts"]), np.nan))
+            for i in range(len(block["ts"])):
+                yield {
+                    "ts": float(block["ts"][i]),
+                    "origin": float(origin[i]),
+                    "company": str(block["company"][i]),
+                    "horizon": int(block["horizon"][i]),
+                    "model_hash": str(block["model_hash"][i]),
+                    "source": str(block["source"][i]),
+                    "forecast": block["values"][offsets[i]:offsets[i + 1]],
+                }
+
+
+# ------------------------
+# Live accuracy: each logged forecast vs the closes that followed its input. Step h
+# of a forecast whose input ends at time `origin` is scored against the (h+1)-th bar
+# of that company after `origin` (not after the serving time, which can be days past
+# the input); records without an origin cannot be lined up and are skipped.
+# ------------------------
+def load_prices(path):
+    prices = {}
+    for bar in read_bars(path):
+        ts = to_epoch(bar.get("timestamp") or bar.get("date"))
+        prices.setdefault(bar["company"], []).append((ts, bar["close"]))
+    series = {}
+    for company, rows in prices.items():
+        rows.sort()
+        series[company] = (np.array([r[0] for r in rows]), np.array([r[1] for r in rows]))
+    return series
+
+
+def live_accuracy(directory, prices, max_horizon=forecasting.MAX_HORIZON):
+    sums = {}
+    no_origin = 0
+    for rec in read_log(directory):
+        company = forecasting.match_company_key(rec["company"], prices)
+        if company is None:
+            continue
+        if np.isnan(rec["origin"]):
+            no_origin += 1
+            continue
+        times, closes = prices[company]
+        start = np.searchsorted(times, rec["origin"], side="right")
+        realized = closes[start:start + min(len(rec["forecast"]), max_horizon)]
+        if not len(realized):
+            continue
+        predicted = rec["forecast"][:len(realized)].astype(float)
+        err = predicted - realized
+        acc = sums.setdefault(rec["company"], {"forecasts": 0, "n": np.zeros(max_horizon),
+                                               "abs": np.zeros(max_horizon), "sq": np.zeros(max_horizon),
+                                               "pct": np.zeros(max_horizon), "bias": np.zeros(max_horizon),
+                                               "models": set()})
+        k = len(err)
+        acc["forecasts"] += 1
+        acc["models"].add(rec["model_hash"])
+        acc["n"][:k] += 1
+        acc["abs"][:k] += np.abs(err)
+        acc["sq"][:k] += err ** 2
+        acc["bias"][:k] += err
+        with np.errstate(divide="ignore", invalid="ignore"):
+            acc["pct"][:k] += np.nan_to_num(np.abs(err / realized)) * 100
+
+    if no_origin:
+        logging.info(f"{no_origin} forecasts from the undated stored snapshot were not scored")
+    report = {}
+    for company, acc in sums.items():
+        scored = int(np.max(np.nonzero(acc["n"])[0])) + 1
+        n = acc["n"][:scored]
+        report[company] = {
+            "forecasts": acc["forecasts"],
+            "model_hashes": sorted(acc["models"]),
+            "n": n.astype(int).tolist(),
+            "mae": (acc["abs"][:scored] / n).tolist(),
+            "rmse": np.sqrt(acc["sq"][:scored] / n).tolist(),
+            "mape": (acc["pct"][:scored] / n).tolist(),
+            "bias": (acc["bias"][:scored] / n).tolist(),
+        }
+    return report
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the forecast audit log and score it against realized prices")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    accuracy = sub.add_parser("accuracy", help="Join logged forecasts with later closes -> per-horizon errors")
+    accuracy.add_argument("--log", default=os.path.join(forecasting.BACKEND_DIR, "audit"))
+    accuracy.add_argument("--prices", required=True, help="CSV / JSON-lines bars with company, timestamp, close")
+    accuracy.add_argument("--out", default=os.path.join(forecasting.BACKEND_DIR, "live_accuracy.json"))
+
+    dump = sub.add_parser("dump", help="Print logged records as JSON lines")
+    dump.add_argument("--log", default=os.path.join(forecasting.BACKEND_DIR, "audit"))
+    dump.add_argument("--company")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "dump":
+        for rec in read_log(args.log):
+            if args.company and rec["company"] != args.company:
+                continue
+            origin = None if np.isnan(rec["origin"]) else rec["origin"]
+            print(json.dumps(dict(rec, origin=origin, forecast=rec["forecast"].tolist())))
+        return 0
+
+    report = live_accuracy(args.log, load_prices(args.prices))
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for company, row in sorted(report.items()):
+        logging.info(f"{company}: {row['forecasts']} forecasts scored, day-1 MAE {row['mae'][0]:.4f}, "
+                     f"day-{len(row['mae'])} MAE {row['mae'][-1]:.4f}")
+    logging.info(f"Wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import logging
+import argparse
+import traceback
+
+import numpy as np
+
+from utils import forecasting
+from utils import modelpack
+
+
+# ------------------------
+# Walk-forward multi-horizon backtest
+#
+# For every historical start point s the model sees data[s - seq_length:s] and is
+# rolled forward H days autoregressively (exactly like /predict). All start points
+# advance together as one (B, seq_length, n_features) tensor, so a ticker costs
+# H model calls per chunk instead of B * H.
+# ------------------------
+def walk_forward(model, scaler, data_scaled, horizon=forecasting.MAX_HORIZON,
+                 seq_length=forecasting.SEQ_LENGTH, stride=1, batch_size=2048):
+    n, n_features = data_scaled.shape
+    starts = np.arange(seq_length, n, stride)
+    if len(starts) == 0:
+        raise ValueError(f"Not enough history for a backtest (need > {seq_length} rows)")
+
+    # windows[k] = data[k:k + seq_length] as a strided view; start s uses windows[s - seq_length]
+    windows = np.lib.stride_tricks.sliding_window_view(data_scaled, seq_length, axis=0).transpose(0, 2, 1)
+    preds = np.empty((len(starts), horizon))
+    for lo in range(0, len(starts), batch_size):
+        idx = starts[lo:lo + batch_size]
+        preds[lo:lo + len(idx)] = forecasting.rollout_batch(model, windows[idx - seq_length], horizon)
+
+    # actual Close for s + h, NaN where the horizon runs past the end of the history
+    targets = starts[:, np.newaxis] + np.arange(horizon)[np.newaxis, :]
+    valid = targets < n
+    actual = data_scaled[np.minimum(targets, n - 1), 0]
+
+    preds_real = forecasting.inverse_close(scaler, preds.ravel(), n_features).reshape(preds.shape)
+    actual_real = forecasting.inverse_close(scaler, actual.ravel(), n_features).reshape(actual.shape)
+    actual_real[~valid] = np.nan
+    return starts, preds_real, actual_real
+
+
+def error_curves(preds_real, actual_real):
+    # per-horizon error over all start points that have a realized value
+    err = preds_real - actual_real
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mape = np.nanmean(np.abs(err) / np.abs(actual_real), axis=0) * 100
+    return {
+        "count": np.sum(~np.isnan(err), axis=0).tolist(),
+        "mae": np.nanmean(np.abs(err), axis=0).tolist(),
+        "rmse": np.sqrt(np.nanmean(err ** 2, axis=0)).tolist(),
+        "mape": mape.tolist(),
+        "bias": np.nanmean(err, axis=0).tolist(),
+    }
+
+
+def backtest_company(company, base_dir=forecasting.BACKEND_DIR, pack=None, horizon=forecasting.MAX_HORIZON,
+                     stride=1, batch_size=2048):
+    model, scaler, data_scaled = forecasting.load_artifacts(company, base_dir, pack)
+    start = time.perf_counter()
+    starts, preds_real, actual_real = walk_forward(model, scaler, data_scaled, horizon,
+                                                   stride=stride, batch_size=batch_size)
+    curves = error_curves(preds_real, actual_real)
+    elapsed = time.perf_counter() - start
+    logging.info(f"{company}: {len(starts)} start points x {horizon} days in {elapsed:.1f}s "
+                 f"(RMSE h=1 {curves['rmse'][0]:.3f}, h={horizon} {curves['rmse'][-1]:.3f})")
+    return dict(curves, start_points=len(starts), horizon=horizon, stride=stride, seconds=round(elapsed, 2))
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward multi-horizon backtest (error by horizon per ticker)")
+    parser.add_argument("--base-dir", default=forecasting.BACKEND_DIR)
+    parser.add_argument("--pack", help="Use a model pack instead of the .h5 models")
+    parser.add_argument("--horizon", type=int, default=forecasting.MAX_HORIZON)
+    parser.add_argument("--stride", type=int, default=1, help="Use every n-th start point")
+    parser.add_argument("--batch-size", type=int, default=2048, help="Start points advanced together")
+    parser.add_argument("--companies", nargs="*")
+    parser.add_argument("--out", default=os.path.join(forecasting.BACKEND_DIR, "backtest.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    pack = modelpack.open_pack(args.pack) if args.pack else None
+    results = {}
+    for company in args.companies or forecasting.MODELS.keys():
+        try:
+            results[company] = backtest_company(company, args.base_dir, pack, args.horizon,
+                                                args.stride, args.batch_size)
+        except Exception:
+            logging.error(f"Backtest failed for {company}:\n{traceback.format_exc()}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    logging.info(f"Backtest curves for {len(results)} tickers written to {args.out}")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
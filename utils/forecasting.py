@@ -0,0 +1,457 @@
+import os
+import json
+import time
+import pickle
+import logging
+import argparse
+import traceback
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------
+# Defaults
+# ------------------------
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+SEQ_LENGTH = 60
+MAX_HORIZON = 100
+PLOT_POINTS = 100
+
+
+# ------------------------
+# Model / Scaler / Dataset Paths (relative to backend/)
+# ------------------------
+MODELS = {
+    "HDFC": "models/hdfc_model.h5",
+    "Reliance": "models/stock_price_model.h5",
+    "Adani": "models/adani_model.h5",
+    "TCS": "models/tcs_model.h5",
+    "Honda": "models/honda_model.h5",
+    "Sony": "models/sony_model.h5",
+    "Nintendo": "models/nintendo_model.h5",
+    "Alibaba": "models/alibaba_model.h5",
+    "Xiaomi": "models/xiaomi_model.h5",
+    "Tencent": "models/tencent_stock_price_model.h5",
+    "Toyota": "models/toyota_stock_price_model.h5",
+    "JD.com Inc": "models/jdhk_model.h5",
+}
+
+SCALERS = {
+    "HDFC": "scalers/hdfc_scaler.pkl",
+    "Reliance": "scalers/nse_scaler.pkl",
+    "TCS": "scalers/tcs_scaler.pkl",
+    "Adani": "scalers/adani_scaler.pkl",
+    "Honda": "scalers/honda_scaler.pkl",
+    "Sony": "scalers/sony_scaler.pkl",
+    "Nintendo": "scalers/nintendo_scaler.pkl",
+    "Alibaba": "scalers/alibaba_scaler.pkl",
+    "Xiaomi": "scalers/xiaomi_scaler.pkl",
+    "Tencent": "scalers/tencent_scaler.pkl",
+    "Toyota": "scalers/toyota_scaler.pkl",
+    "JD.com Inc": "scalers/jdhk_scaler.pkl",
+}
+
+DATASETS = {
+    "HDFC": "scaled_data/hdfc_scaled_data.pkl",
+    "Reliance": "scaled_data/nse_scaled_data.pkl",
+    "TCS": "scaled_data/tcs_scaled_data.pkl",
+    "Adani": "scaled_data/adani_scaled_data.pkl",
+    "Honda": "scaled_data/honda_scaled_data.pkl",
+    "Sony": "scaled_data/sony_scaled_data.pkl",
+    "Nintendo": "scaled_data/nintendo_scaled_data.pkl",
+    "Alibaba": "scaled_data/alibaba_scaled_data.pkl",
+    "Xiaomi": "scaled_data/xiaomi_scaled_data.pkl",
+    "Tencent": "scaled_data/tencent_scaled_data.pkl",
+    "Toyota": "scaled_data/toyota_scaled_data.pkl",
+    "JD.com Inc": "scaled_data/jdhk_scaled_data.pkl",
+}
+
+
+def resolve(path, base_dir=None):
+    if base_dir is None or os.path.isabs(path):
+        return path
+    return os.path.join(base_dir, path)
+
+
+def match_company_key(company, keys):
+    # exact first, then case-insensitive
+    if company in keys:
+        return company
+    return next((k for k in keys if k.lower() == company.lower()), None)
+
+
+# ------------------------
+# Artifact loading
+# ------------------------
+def load_model(path):
+    # imported lazily so store-only tooling does not pay for TensorFlow
+    import tensorflow as tf
+    return tf.keras.models.load_model(path, compile=False)
+
+
+def load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_dataset(path):
+    data_scaled = np.array(load_pickle(path))
+    if data_scaled.ndim == 1:
+        # make it 2D with single column
+        data_scaled = data_scaled.reshape(-1, 1)
+    return data_scaled
+
+
+def direct_path(model_path):
+    # direct multi-horizon model trained next to the one-step model: models/sony_model_direct.h5
+    root, ext = os.path.splitext(model_path)
+    return f"{root}_direct{ext}"
+
+
+def model_source(company, base_dir=BACKEND_DIR):
+    # the company's direct multi-horizon model when one has been trained, else the one-step model
+    path = MODELS[company]
+    return direct_path(path) if os.path.isfile(resolve(direct_path(path), base_dir)) else path
+
+
+def load_artifacts(company, base_dir=BACKEND_DIR, pack=None, global_model=None):
+    # (model, scaler, data_scaled); model and scaler come from a utils.modelpack.ModelPack when given,
+    # the model from a utils.global_model.GlobalModel that covers the company
+    if pack is not None and company in pack:
+        model, scaler = pack.model(company), pack.scaler(company)
+    else:
+        model = None
+        scaler = load_pickle(resolve(SCALERS[company], base_dir))
+    if global_model is not None and company in global_model:
+        model = global_model.bind([company])
+    elif model is None:
+        model = load_model(resolve(model_source(company, base_dir), base_dir))
+    return model, scaler, load_dataset(resolve(DATASETS[company], base_dir))
+
+
+def artifact_version(company, base_dir=BACKEND_DIR, pack=None, global_model=None):
+    # mtimes of the files load_artifacts reads for this company (pack / global model parts
+    # are fixed for the process); a change means a retrain or a refreshed dataset
+    paths = [DATASETS[company]]
+    if pack is None or company not in pack:
+        paths.append(SCALERS[company])
+        if global_model is None or company not in global_model:
+            paths.append(model_source(company, base_dir))
+    version = []
+    for path in paths:
+        try:
+            version.append(os.path.getmtime(resolve(path, base_dir)))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+# ------------------------
+# Windows / scaling helpers
+# ------------------------
+def build_windows(data_scaled, seq_length=SEQ_LENGTH):
+    # X[k] = data[k:k + seq_length], y[k] = data[k + seq_length, 0] (no copy of the windows)
+    windows = np.lib.stride_tricks.sliding_window_view(data_scaled, seq_length, axis=0)
+    X = windows[:-1].transpose(0, 2, 1)
+    y = data_scaled[seq_length:, 0]
+    return X, y
+
+
+def inverse_close(scaler, values, n_features):
+    # pad the Close column with zeros for the remaining features, keep column 0
+    arr = np.asarray(values, dtype=float).reshape(-1, 1)
+    pad = np.zeros((arr.shape[0], max(0, n_features - 1)))
+    return scaler.inverse_transform(np.concatenate([arr, pad], axis=1))[:, 0]
+
+
+# ------------------------
+# Inference
+# ------------------------
+class ForecastError(Exception):
+    pass
+
+
+def backtest(model, scaler, data_scaled, seq_length=SEQ_LENGTH):
+    # one-step-ahead predictions over the whole history -> (actual, predicted), rescaled
+    X, y = build_windows(data_scaled, seq_length)
+    preds = np.asarray(model.predict(X, verbose=0)).reshape(len(X), -1)[:, 0]
+    n_features = data_scaled.shape[1]
+    return inverse_close(scaler, y, n_features), inverse_close(scaler, preds, n_features)
+
+
+def rollout_batch(model, windows, days, deadline=None):
+    # advance a batch of (B, seq_length, n_features) windows together, one model call per day.
+    # each prediction is fed back as a row padded with zeros; returns (B, days) in scaled space.
+    # a direct multi-horizon model (H outputs, H >= days) answers in one call; with H < days
+    # its first output (next day) drives the loop like a one-step model.
+    # deadline (utils.admission.Deadline) is checked between model calls to abort cooperatively
+    current = np.array(windows, dtype=np.float32)
+    batch = current.shape[0]
+    forecast = np.empty((batch, days))
+    for step in range(days):
+        if deadline is not None:
+            deadline.check()
+        outputs = np.asarray(model.predict(current, verbose=0, batch_size=batch)).reshape(batch, -1)
+        if step == 0 and outputs.shape[1] >= days:
+            forecast[:] = outputs[:, :days]
+            return forecast
+        preds = outputs[:, 0]
+        forecast[:, step] = preds
+        current[:, :-1, :] = current[:, 1:, :]
+        current[:, -1, :] = 0.0
+        current[:, -1, 0] = preds
+    return forecast
+
+
+def rollout(model, data_scaled, days, seq_length=SEQ_LENGTH, deadline=None):
+    # iterative forecast from the latest window
+    return rollout_batch(model, data_scaled[-seq_length:][np.newaxis], days, deadline)[0]
+
+
+def forecast_series(model, scaler, data_scaled, days, window=None, seq_length=SEQ_LENGTH, deadline=None,
+                    with_backtest=True):
+    # everything /predict needs from the model: backtest tail for the plot + rescaled forecast.
+    # window overrides the rollout start (e.g. a live ring buffer) instead of the stored history
+    if len(data_scaled) < seq_length + 1:
+        raise ForecastError(f"Not enough historical data (need > {seq_length})")
+    if deadline is not None:
+        deadline.check()
+    y_real = preds_real = None
+    if with_backtest:
+        y_real, preds_real = backtest(model, scaler, data_scaled, seq_length)
+        y_real, preds_real = y_real[-PLOT_POINTS:], preds_real[-PLOT_POINTS:]
+    if window is None:
+        window = data_scaled[-seq_length:]
+    forecast = rollout_batch(model, np.asarray(window)[np.newaxis], days, deadline)[0]
+    return {
+        "actual": y_real,
+        "predicted": preds_real,
+        "forecast_scaled": forecast,
+        "forecast": inverse_close(scaler, forecast, data_scaled.shape[1]),
+    }
+
+
+def render_plot(y_real, preds_real, company, plots_dir, points=PLOT_POINTS):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(10, 6))
+    try:
+        plt.plot(y_real[-points:], label="Actual Prices", linewidth=2)
+        plt.plot(preds_real[-points:], label="Predicted Prices", linestyle="--", linewidth=2)
+        plt.title(f"Actual vs Predicted Stock Prices ({company})")
+        plt.xlabel("Days")
+        plt.ylabel("Stock Price")
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        plot_filename = f"{company}_actual_vs_predicted.png"
+        plt.savefig(os.path.join(plots_dir, plot_filename))
+    finally:
+        plt.close(fig)
+    return plot_filename
+
+
+# ------------------------
+# GeoRisk join
+# ------------------------
+def find_company_row(company_risk_df, company_name):
+    if company_risk_df.empty:
+        return pd.DataFrame()
+    name = company_name.strip().lower()
+    # exact (case-insensitive)
+    exact = company_risk_df[company_risk_df["company"].str.lower() == name]
+    if not exact.empty:
+        return exact.iloc[[0]]
+    # contains
+    contains = company_risk_df[company_risk_df["company"].str.lower().str.contains(name, regex=False)]
+    if not contains.empty:
+        return contains.iloc[[0]]
+    return pd.DataFrame()
+
+
+def risk_join(company, company_risk_df, country_grsi_df):
+    company_row = find_company_row(company_risk_df, company)
+    company_risk_value = None
+    country_grsi_value = None
+    if not company_row.empty:
+        if "grsi" in company_row.columns:
+            company_risk_value = float(company_row.iloc[0]["grsi"])
+        if "country" in company_row.columns:
+            comp_country = company_row.iloc[0]["country"]
+            if not country_grsi_df.empty and "country" in country_grsi_df.columns and "grsi" in country_grsi_df.columns:
+                country_row = country_grsi_df[country_grsi_df["country"].str.lower() == str(comp_country).lower()]
+                if not country_row.empty:
+                    country_grsi_value = float(country_row.iloc[0]["grsi"])
+    return company_risk_value, country_grsi_value
+
+
+def load_csv(path):
+    try:
+        df = pd.read_csv(path)
+        df.columns = df.columns.str.strip().str.lower()
+        return df
+    except FileNotFoundError:
+        logging.error(f"CSV file not found: {path}")
+        return pd.DataFrame()
+
+
+# ------------------------
+# Precompute (bulk, off-peak)
+# ------------------------
+def precompute_company(company, base_dir=BACKEND_DIR, horizon=MAX_HORIZON, plots_dir=None,
+                       company_risk_df=None, country_grsi_df=None):
+    model, scaler, data_scaled = load_artifacts(company, base_dir)
+    out = forecast_series(model, scaler, data_scaled, horizon)
+
+    plot_filename = None
+    if plots_dir:
+        plot_filename = render_plot(out["actual"], out["predicted"], company, plots_dir)
+
+    company_risk_value, country_grsi_value = None, None
+    if company_risk_df is not None and country_grsi_df is not None:
+        company_risk_value, country_grsi_value = risk_join(company, company_risk_df, country_grsi_df)
+
+    return {
+        "forecast": out["forecast"],
+        "actual": out["actual"],
+        "predicted": out["predicted"],
+        "plot": plot_filename,
+        "company_risk": company_risk_value,
+        "country_grsi": country_grsi_value,
+    }
+
+
+def precompute(companies=None, base_dir=BACKEND_DIR, horizon=MAX_HORIZON, plots_dir=None):
+    companies = list(companies or MODELS.keys())
+    company_risk_df = load_csv(os.path.join(base_dir, "dataset", "company_risk.csv"))
+    country_grsi_df = load_csv(os.path.join(base_dir, "dataset", "country_GRSI.csv"))
+    if plots_dir:
+        os.makedirs(plots_dir, exist_ok=True)
+
+    entries = {}
+    for company in companies:
+        start = time.perf_counter()
+        try:
+            entries[company] = precompute_company(company, base_dir, horizon, plots_dir,
+                                                  company_risk_df, country_grsi_df)
+        except Exception:
+            logging.error(f"Precompute failed for {company}:\n{traceback.format_exc()}")
+            continue
+        logging.info(f"Precomputed {company} in {time.perf_counter() - start:.2f}s")
+    return entries
+
+
+# ------------------------
+# Forecast store: one .npz with float32 arrays + JSON index
+# ------------------------
+def save_store(path, entries, horizon=MAX_HORIZON):
+    arrays = {}
+    index = []
+    for i, (company, entry) in enumerate(entries.items()):
+        for field in ("forecast", "actual", "predicted"):
+            arrays[f"{field}_{i}"] = np.asarray(entry[field], dtype=np.float32)
+        index.append({
+            "company": company,
+            "slot": i,
+            "plot": entry.get("plot"),
+            "company_risk": entry.get("company_risk"),
+            "country_grsi": entry.get("country_grsi"),
+        })
+    meta = {"created": time.time(), "horizon": horizon, "seq_length": SEQ_LENGTH, "entries": index}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+
+    # write next to the target and swap in atomically so a serving process never sees a partial file
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ForecastStore:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.horizon = 0
+        self.created = None
+        self.entries = {}
+        self.reload()
+
+    def reload(self):
+        mtime = os.path.getmtime(self.path)
+        with np.load(self.path) as npz:
+            meta = json.loads(npz["meta"].tobytes().decode("utf-8"))
+            entries = {}
+            for item in meta["entries"]:
+                slot = item["slot"]
+                entries[item["company"]] = dict(
+                    item,
+                    forecast=npz[f"forecast_{slot}"].astype(float),
+                    actual=npz[f"actual_{slot}"].astype(float),
+                    predicted=npz[f"predicted_{slot}"].astype(float),
+                )
+        self.entries = entries
+        self.horizon = int(meta["horizon"])
+        self.created = meta.get("created")
+        self.mtime = mtime
+        logging.info(f"Loaded forecast store {self.path} ({len(entries)} tickers, horizon {self.horizon})")
+
+    def refresh(self):
+        # cheap stat() per lookup so a nightly rewrite is picked up without a restart
+        try:
+            if os.path.getmtime(self.path) != self.mtime:
+                self.reload()
+        except OSError:
+            logging.error(f"Forecast store unavailable: {self.path}")
+
+    def lookup(self, company, days):
+        self.refresh()
+        entry = self.entries.get(company)
+        if entry is None or days > self.horizon:
+            return None
+        return dict(entry, forecast=entry["forecast"][:days])
+
+
+def open_store(path):
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        return ForecastStore(path)
+    except Exception:
+        logging.error(f"Failed to open forecast store {path}:\n{traceback.format_exc()}")
+        return None
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stock forecasting batch jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pre = sub.add_parser("precompute", help="Precompute forecasts, backtests and risk joins into a store")
+    pre.add_argument("--base-dir", default=BACKEND_DIR, help="Directory holding models/, scalers/, scaled_data/, dataset/")
+    pre.add_argument("--out", default=os.path.join(BACKEND_DIR, "forecast_store.npz"))
+    pre.add_argument("--plots-dir", default=os.path.join(BACKEND_DIR, "plots"))
+    pre.add_argument("--horizon", type=int, default=MAX_HORIZON)
+    pre.add_argument("--companies", nargs="*", help="Subset of companies (default: all)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "precompute":
+        entries = precompute(args.companies, args.base_dir, args.horizon, args.plots_dir)
+        if not entries:
+            logging.error("Nothing precomputed; store not written")
+            return 1
+        save_store(args.out, entries, args.horizon)
+        logging.info(f"Wrote {len(entries)} tickers to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,226 @@
+import os
+import json
+import logging
+import traceback
+import argparse
+
+import numpy as np
+
+from utils import forecasting
+from utils import training
+
+
+# ------------------------
+# One LSTM for all tickers: the input window is concatenated with a learned
+# ticker embedding at every step. Normalization stays per ticker: each series
+# is the ticker's own MinMax-scaled data and its scaler maps forecasts back.
+# The ticker vocabulary is stored next to the model (global_model.json).
+# ------------------------
+GLOBAL_MODEL_PATH = "models/global_model.h5"
+EMBEDDING_DIM = 8
+
+
+def vocab_path(model_path):
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+# ------------------------
+# Training data: each window is (start row within its ticker, ticker id), split
+# chronologically within every ticker; series stay as given (memory-mapped .npy
+# files are not copied) and batches are gathered per ticker on the fly
+# ------------------------
+def stack_series(series_list, seq_length=forecasting.SEQ_LENGTH, val_fraction=training.VAL_FRACTION, horizon=1):
+    n_features = {s.shape[1] for s in series_list}
+    if len(n_features) != 1:
+        raise ValueError(f"All tickers need the same features, got widths {sorted(n_features)}")
+    train_index, val_index = [], []
+    for ticker_id, series in enumerate(series_list):
+        train_idx, val_idx = training.split_indices(len(series), seq_length, val_fraction, horizon)
+        train_index.append(np.stack([train_idx, np.full(len(train_idx), ticker_id)], axis=1))
+        val_index.append(np.stack([val_idx, np.full(len(val_idx), ticker_id)], axis=1))
+    return n_features.pop(), np.concatenate(train_index), np.concatenate(val_index)
+
+
+def gather_mixed(series_list, batch, seq_length=forecasting.SEQ_LENGTH, horizon=1):
+    # batch rows are (start, ticker id); windows keep the batch order
+    n_features = series_list[0].shape[1]
+    x = np.empty((len(batch), seq_length, n_features), dtype=np.float32)
+    y = np.empty((len(batch),) if horizon == 1 else (len(batch), horizon), dtype=np.float32)
+    for ticker in np.unique(batch[:, 1]):
+        rows = batch[:, 1] == ticker
+        x[rows], y[rows] = training.gather_windows(series_list[ticker], batch[rows, 0], seq_length, horizon)
+    return x, y, batch[:, 1].astype(np.int32)
+
+
+def global_dataset(series_list, index, seq_length=forecasting.SEQ_LENGTH, batch_size=training.BATCH_SIZE,
+                   shuffle=False, seed=None, horizon=1):
+    # same streaming gather as training.window_dataset, yielding ((window, ticker id), target)
+    import tensorflow as tf
+
+    n_features = series_list[0].shape[1]
+
+    ds = tf.data.Dataset.from_tensor_slices(np.asarray(index, dtype=np.int64))
+    if shuffle:
+        ds = ds.shuffle(len(index), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    def gather(batch):
+        x, y, ticker = tf.numpy_function(lambda b: gather_mixed(series_list, b, seq_length, horizon), [batch],
+                                         (tf.float32, tf.float32, tf.int32))
+        x.set_shape([None, seq_length, n_features])
+        y.set_shape([None] if horizon == 1 else [None, horizon])
+        ticker.set_shape([None])
+        return (x, ticker), y
+
+    return ds.map(gather, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+# ------------------------
+# Model
+# ------------------------
+def build_global_model(n_tickers, seq_length, n_features, units=training.UNITS, dropout=training.DROPOUT,
+                       horizon=1, embedding_dim=EMBEDDING_DIM):
+    from keras import Model
+    from keras.layers import LSTM, Dense, Dropout, Input, Embedding, RepeatVector, Concatenate
+
+    window = Input(shape=(seq_length, n_features), name="window")
+    ticker = Input(shape=(), dtype="int32", name="ticker")
+    embedding = Embedding(n_tickers, embedding_dim, name="ticker_embedding")(ticker)
+    x = Concatenate()([window, RepeatVector(seq_length)(embedding)])
+    for i, n_units in enumerate(units):
+        x = LSTM(units=n_units, return_sequences=i < len(units) - 1)(x)
+        x = Dropout(dropout)(x)
+    model = Model([window, ticker], Dense(units=horizon)(x))
+    model.compile(optimizer="adam", loss="mean_squared_error")
+    return model
+
+
+def train_global(series_by_ticker, seq_length=forecasting.SEQ_LENGTH, units=training.UNITS,
+                 dropout=training.DROPOUT, epochs=training.EPOCHS, batch_size=training.BATCH_SIZE,
+                 val_fraction=training.VAL_FRACTION, seed=None, callbacks=None, verbose=1, horizon=1,
+                 embedding_dim=EMBEDDING_DIM):
+    companies = list(series_by_ticker)
+    series_list = [series_by_ticker[c] for c in companies]
+    n_features, train_index, val_index = stack_series(series_list, seq_length, val_fraction, horizon)
+    train_ds = global_dataset(series_list, train_index, seq_length, batch_size, shuffle=True, seed=seed,
+                              horizon=horizon)
+    val_ds = global_dataset(series_list, val_index, seq_length, batch_size, horizon=horizon)
+
+    model = build_global_model(len(companies), seq_length, n_features, units, dropout, horizon, embedding_dim)
+    history = model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=callbacks, verbose=verbose)
+    vocab = {company: i for i, company in enumerate(companies)}
+    return model, vocab, history.history
+
+
+def save_global(model, vocab, path, seq_length, horizon):
+    model.save(path)
+    meta = {"vocab": vocab, "seq_length": seq_length, "horizon": horizon}
+    with open(vocab_path(path), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+# ------------------------
+# Serving
+# ------------------------
+class TickerModel:
+    # Keras-style predict() over the global model with the ticker ids fixed: one id per
+    # batch row (mixed companies) or a single id broadcast over any batch (one company),
+    # so forecasting.rollout_batch / backtest use it like a per-ticker model
+    def __init__(self, model, ids):
+        self.model = model
+        self.ids = np.asarray(ids, dtype=np.int32)
+
+    def predict(self, X, verbose=0, batch_size=None):
+        X = np.asarray(X, dtype=np.float32)
+        ids = self.ids if len(self.ids) == len(X) else np.full(len(X), self.ids[0], dtype=np.int32)
+        return np.asarray(self.model.predict([X, ids], verbose=0, batch_size=batch_size or 256))
+
+
+class GlobalVocab:
+    # the vocabulary and shapes without the weights: enough for a process that routes
+    # global rollouts to inference workers (which load the model themselves)
+    def __init__(self, path):
+        with open(vocab_path(path)) as f:
+            meta = json.load(f)
+        self.path = path
+        self.vocab = meta["vocab"]
+        self.seq_length = meta.get("seq_length", forecasting.SEQ_LENGTH)
+        self.horizon = meta.get("horizon", 1)
+
+    def __contains__(self, company):
+        return company in self.vocab
+
+    def metadata(self):
+        return {"path": self.path, "tickers": sorted(self.vocab), "seq_length": self.seq_length,
+                "horizon": self.horizon}
+
+
+class GlobalModel(GlobalVocab):
+    def __init__(self, path):
+        super().__init__(path)
+        self.model = forecasting.load_model(path)
+
+    def bind(self, companies):
+        return TickerModel(self.model, [self.vocab[c] for c in companies])
+
+
+def open_global_model(path, with_model=True):
+    if not path or not os.path.isfile(path) or not os.path.isfile(vocab_path(path)):
+        return None
+    try:
+        model = GlobalModel(path) if with_model else GlobalVocab(path)
+        logging.info(f"Loaded global model {'' if with_model else 'vocabulary '}{path} ({len(model.vocab)} tickers)")
+        return model
+    except Exception:
+        logging.error(f"Failed to load global model {path}:\n{traceback.format_exc()}")
+        return None
+
+
+def forecast_mixed(global_model, companies, windows, days, deadline=None):
+    # any mix of companies, one (B, seq_length, n_features) batch -> (B, days) scaled paths,
+    # one forward pass per day (or a single pass for a direct global model)
+    return forecasting.rollout_batch(global_model.bind(companies), np.stack(windows), days, deadline)
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train one LSTM across all tickers with ticker embeddings")
+    parser.add_argument("--companies", nargs="*")
+    parser.add_argument("--base-dir", default=forecasting.BACKEND_DIR)
+    parser.add_argument("--out", help="Where to save the model (default: backend/models/global_model.h5)")
+    parser.add_argument("--seq-length", type=int, default=forecasting.SEQ_LENGTH)
+    parser.add_argument("--units", type=int, nargs="+", default=list(training.UNITS))
+    parser.add_argument("--dropout", type=float, default=training.DROPOUT)
+    parser.add_argument("--embedding-dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--epochs", type=int, default=training.EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=training.BATCH_SIZE)
+    parser.add_argument("--val-fraction", type=float, default=training.VAL_FRACTION)
+    parser.add_argument("--direct", action="store_true", help="Multi-horizon head (see utils.training --direct)")
+    parser.add_argument("--horizon", type=int, default=forecasting.MAX_HORIZON)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    series_by_ticker = {}
+    for company in args.companies or forecasting.DATASETS.keys():
+        path = forecasting.resolve(forecasting.DATASETS[company], args.base_dir)
+        if not os.path.isfile(path):
+            logging.warning(f"Skipping {company}: {path} not found")
+            continue
+        series_by_ticker[company] = training.load_series(path)
+
+    horizon = args.horizon if args.direct else 1
+    model, vocab, history = train_global(series_by_ticker, args.seq_length, tuple(args.units), args.dropout,
+                                         args.epochs, args.batch_size, args.val_fraction, args.seed,
+                                         horizon=horizon, embedding_dim=args.embedding_dim)
+    out = args.out or forecasting.resolve(GLOBAL_MODEL_PATH, args.base_dir)
+    save_global(model, vocab, out, args.seq_length, horizon)
+    logging.info(f"Saved global model for {len(vocab)} tickers to {out} "
+                 f"(final val_loss {history['val_loss'][-1]:.6f})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
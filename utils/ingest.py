@@ -0,0 +1,274 @@
+import os
+import csv
+import json
+import time
+import logging
+import argparse
+import threading
+import urllib.request
+from collections import deque
+
+import numpy as np
+
+from utils import forecasting
+
+
+# ------------------------
+# Feature layout used by the daily-ticker notebooks: Close, MA50, MA200, Volatility
+# (Volatility = rolling std of Close pct_change over 50 bars, annualized by sqrt(252))
+# ------------------------
+MA_SHORT = 50
+MA_LONG = 200
+VOL_WINDOW = 50
+VOL_ANNUALIZE = 252 ** 0.5
+BAR_FIELDS = ("company", "timestamp", "open", "high", "low", "close", "volume")
+
+
+# ------------------------
+# Fixed-size ring buffer of the last N scaled feature rows
+# ------------------------
+class RingBuffer:
+    def __init__(self, size, n_features):
+        self.size = size
+        self.rows = np.zeros((size, n_features), dtype=np.float32)
+        self.head = 0
+        self.count = 0
+
+    def append(self, row):
+        self.rows[self.head] = row
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def window(self):
+        # oldest -> newest copy
+        return np.roll(self.rows, -self.head, axis=0)
+
+
+# ------------------------
+# Per-ticker feed: raw close history for the rolling features + scaled ring buffer
+# ------------------------
+class TickerFeed:
+    def __init__(self, company, scaler, data_scaled, seq_length=forecasting.SEQ_LENGTH):
+        n_features = data_scaled.shape[1]
+        if n_features not in (1, 4):
+            raise ValueError(f"{company}: unsupported feature layout ({n_features} columns)")
+        self.company = company
+        self.scaler = scaler
+        self.n_features = n_features
+        self.lock = threading.Lock()
+        self.version = 0
+        self.last_timestamp = None
+        self.bars = 0
+
+        # seed from the stored snapshot so the first live bar already has full context
+        self.buffer = RingBuffer(seq_length, n_features)
+        self.buffer.extend(data_scaled[-seq_length:])
+        history = data_scaled[-(MA_LONG + 1):, 0]
+        self.closes = deque(forecasting.inverse_close(scaler, history, n_features).tolist(), maxlen=MA_LONG + 1)
+
+    def features(self):
+        closes = np.asarray(self.closes)
+        if self.n_features == 1:
+            return np.array([closes[-1]])
+        returns = np.diff(closes[-(VOL_WINDOW + 1):]) / closes[-(VOL_WINDOW + 1):-1]
+        return np.array([
+            closes[-1],
+            closes[-MA_SHORT:].mean(),
+            closes[-MA_LONG:].mean(),
+            returns.std(ddof=1) * VOL_ANNUALIZE if len(returns) > 1 else 0.0,
+        ])
+
+    def update(self, close, timestamp=None):
+        with self.lock:
+            self.closes.append(float(close))
+            row = self.scaler.transform(self.features().reshape(1, -1))[0]
+            self.buffer.append(row)
+            self.version += 1
+            self.bars += 1
+            self.last_timestamp = timestamp
+            return self.version
+
+    def snapshot(self):
+        with self.lock:
+            return self.buffer.window(), self.version
+
+    def status(self):
+        return {"version": self.version, "bars": self.bars, "last_timestamp": self.last_timestamp,
+                "last_close": self.closes[-1] if self.closes else None}
+
+
+# ------------------------
+# Hub: feeds per ticker, seeded lazily, with update listeners
+# ------------------------
+class IngestHub:
+    def __init__(self, seed_fn, seq_length=forecasting.SEQ_LENGTH):
+        # seed_fn(company) -> (scaler, data_scaled)
+        self.seed_fn = seed_fn
+        self.seq_length = seq_length
+        self.feeds = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def feed(self, company):
+        return self.feeds.get(company)
+
+    def remove(self, company):
+        with self.lock:
+            self.feeds.pop(company, None)
+
+    def on_update(self, callback):
+        self.listeners.append(callback)
+
+    def ingest(self, company, close, timestamp=None):
+        feed = self.feeds.get(company)
+        if feed is None:
+            with self.lock:
+                feed = self.feeds.get(company)
+                if feed is None:
+                    scaler, data_scaled = self.seed_fn(company)
+                    feed = TickerFeed(company, scaler, data_scaled, self.seq_length)
+                    self.feeds[company] = feed
+        version = feed.update(close, timestamp)
+        for callback in self.listeners:
+            callback(company, version)
+        return version
+
+    def status(self):
+        return {company: feed.status() for company, feed in self.feeds.items()}
+
+
+# ------------------------
+# Per-ticker forecast cache keyed by feed version
+# ------------------------
+class ForecastCache:
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, company, version, days):
+        with self.lock:
+            entry = self.entries.get(company)
+        if entry is None or entry[0] != version or len(entry[1]) < days:
+            return None
+        return entry[1][:days]
+
+    def put(self, company, version, forecast):
+        with self.lock:
+            current = self.entries.get(company)
+            # keep the longest path computed for this version
+            if current is None or current[0] != version or len(current[1]) < len(forecast):
+                self.entries[company] = (version, np.asarray(forecast))
+
+    def invalidate(self, company):
+        with self.lock:
+            self.entries.pop(company, None)
+
+
+# ------------------------
+# Bar sources: CSV / JSON-lines file, replayed once or tailed
+# ------------------------
+def parse_bar(record):
+    bar = {k.strip().lower(): v for k, v in record.items() if k}
+    if not bar.get("company") or bar.get("close") in (None, ""):
+        raise ValueError(f"Bar needs company and close: {record}")
+    bar["close"] = float(bar["close"])
+    return bar
+
+
+def read_bars(path, follow=False, poll=1.0):
+    with open(path) as f:
+        header = None
+        while True:
+            pos = f.tell()
+            line = f.readline()
+            if not line or (follow and not line.endswith("\n")):
+                if not follow:
+                    return
+                # wait for the writer to finish the line
+                f.seek(pos)
+                time.sleep(poll)
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                if line.startswith("{"):
+                    bar = parse_bar(json.loads(line))
+                else:
+                    values = next(csv.reader([line]))
+                    if header is None:
+                        header = [v.strip().lower() for v in values]
+                        if "close" in header:
+                            continue
+                        # headerless CSV in BAR_FIELDS order
+                        header = list(BAR_FIELDS)
+                    bar = parse_bar(dict(zip(header, values)))
+            except (ValueError, csv.Error) as exc:
+                # one malformed line must not end a tail; json errors are ValueErrors
+                logging.warning(f"{path}: skipping malformed bar ({exc}): {line[:200]}")
+                continue
+            yield bar
+
+
+def tail_into(sink, path, follow=True, poll=1.0):
+    # background source for the backend (INGEST_TAIL); sink(bar) does the ingest
+    def run():
+        for bar in read_bars(path, follow=follow, poll=poll):
+            try:
+                sink(bar)
+            except Exception as exc:
+                logging.error(f"Ingest from {path} failed for {bar.get('company')}: {exc}")
+
+    thread = threading.Thread(target=run, name="ingest-tail", daemon=True)
+    thread.start()
+    return thread
+
+
+def post_bars(url, bars, batch=50, token=None):
+    buffer = []
+    for bar in bars:
+        buffer.append(bar)
+        if len(buffer) >= batch:
+            _post(url, buffer, token)
+            buffer = []
+    if buffer:
+        _post(url, buffer, token)
+
+
+def _post(url, bars, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["X-Admin-Token"] = token
+    req = urllib.request.Request(url, data=json.dumps(bars).encode("utf-8"), headers=headers, method="POST")
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+# ------------------------
+# CLI: replay a bar file into a running backend
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay or tail OHLCV bars into the backend /ingest endpoint")
+    parser.add_argument("path", help="CSV (company,timestamp,open,high,low,close,volume) or JSON-lines file")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/ingest")
+    parser.add_argument("--follow", action="store_true", help="Keep tailing the file for new bars")
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--token", default=os.environ.get("ADMIN_TOKEN"),
+                        help="Backend ADMIN_TOKEN (default: $ADMIN_TOKEN; not needed on loopback without one)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if not os.path.isfile(args.path):
+        logging.error(f"No such file: {args.path}")
+        return 1
+    # when tailing, send every bar as it arrives
+    post_bars(args.url, read_bars(args.path, follow=args.follow), 1 if args.follow else args.batch, args.token)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
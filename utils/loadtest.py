@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from utils import forecasting
+from utils.synthetic import make_synthetic_backend
+from utils.memory import rss_bytes, mb
+
+
+# ------------------------
+# Defaults
+# ------------------------
+DEFAULT_MIX = {"predict": 0.5, "grsi": 0.2, "company_risk": 0.15, "plots": 0.15}
+DEFAULT_DAYS = (1, 100)
+
+
+# ------------------------
+# Process helpers
+# ------------------------
+def start_backend(work_dir, port, env=None, app_module="app", asgi=False):
+    # runs backend/<app_module>.py with work_dir as cwd (models/, scaled_data/, dataset/, plots/ resolve there);
+    # asgi=True serves it with uvicorn via the module's serve()
+    server_env = dict(os.environ, **(env or {}))
+    server_env["PYTHONPATH"] = os.pathsep.join(filter(None, [forecasting.BACKEND_DIR, server_env.get("PYTHONPATH")]))
+    if asgi:
+        code = f"import {app_module}; {app_module}.serve(host='127.0.0.1', port={port})"
+    else:
+        code = f"import {app_module}; {app_module}.app.run(host='127.0.0.1', port={port}, threaded=True)"
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=work_dir, env=server_env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=1):
+                return proc, base_url
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Backend did not start within 60s")
+
+
+def stop_backend(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ------------------------
+# Requests
+# ------------------------
+def http(method, url, body=None, timeout=60, headers=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers=dict({"Content-Type": "application/json"}, **(headers or {})))
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read()
+
+
+def make_request(op, base_url, companies, days_range, rng):
+    company = rng.choice(companies)
+    if op == "predict":
+        days = rng.randint(*days_range)
+        return http("POST", f"{base_url}/predict", {"company": company, "days": days})
+    if op == "grsi":
+        return http("GET", f"{base_url}/grsi?company={urllib.parse.quote(company)}")
+    if op == "company_risk":
+        return http("GET", f"{base_url}/company_risk")
+    if op == "plots":
+        return http("GET", f"{base_url}/plots/{urllib.parse.quote(company)}_actual_vs_predicted.png")
+    raise ValueError(f"Unknown operation {op}")
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50": round(p50 * 1000, 1), "p95": round(p95 * 1000, 1), "p99": round(p99 * 1000, 1)}
+
+
+# ------------------------
+# Load generator
+# ------------------------
+def run_load(base_url, companies, mix=None, concurrency=8, duration=30.0, days_range=DEFAULT_DAYS,
+             server_pid=None, sample_interval=1.0, seed=0):
+    mix = mix or DEFAULT_MIX
+    ops, weights = zip(*mix.items())
+    samples = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    start = time.monotonic()
+
+    def worker(idx):
+        rng = random.Random(seed + idx)
+        while not stop.is_set():
+            op = rng.choices(ops, weights)[0]
+            t0 = time.monotonic()
+            try:
+                status, _ = make_request(op, base_url, companies, days_range, rng)
+            except Exception:
+                status = 0
+            with lock:
+                samples.append((op, t0 - start, time.monotonic() - t0, status))
+
+    rss_series = []
+
+    def sampler():
+        while not stop.wait(sample_interval):
+            rss_series.append({"t": round(time.monotonic() - start, 1), "rss_mb": mb(rss_bytes(server_pid))})
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    if server_pid:
+        threads.append(threading.Thread(target=sampler, daemon=True))
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=120)
+    return summarize(samples, time.monotonic() - start, rss_series)
+
+
+def summarize(samples, elapsed, rss_series):
+    report = {"elapsed_s": round(elapsed, 1), "requests": len(samples),
+              "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+              "operations": {}, "rss": rss_series}
+    for op in sorted({s[0] for s in samples}):
+        rows = [s for s in samples if s[0] == op]
+        ok = [s[2] for s in rows if 200 <= s[3] < 300]
+        rejected = sum(1 for s in rows if s[3] in (429, 503))
+        errors = sum(1 for s in rows if not 200 <= s[3] < 300) - rejected
+        report["operations"][op] = dict(
+            percentiles(ok),
+            requests=len(rows),
+            throughput_rps=round(len(rows) / elapsed, 2),
+            error_rate=round(errors / len(rows), 4),
+            rejected_rate=round(rejected / len(rows), 4),
+        )
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']}s -> {report['throughput_rps']} req/s")
+    print(f"{'operation':<14}{'req':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>8}{'429/503':>9}")
+    for op, row in report["operations"].items():
+        print(f"{op:<14}{row['requests']:>7}{row['throughput_rps']:>9}{str(row['p50']):>10}{str(row['p95']):>10}"
+              f"{str(row['p99']):>10}{row['error_rate']:>8.2%}{row['rejected_rate']:>9.2%}")
+    rss = [r["rss_mb"] for r in report["rss"] if r["rss_mb"] is not None]
+    if rss:
+        print(f"server RSS: start {rss[0]} MB, peak {max(rss)} MB, end {rss[-1]} MB")
+
+
+def parse_mix(text):
+    # "predict=0.6,grsi=0.2,plots=0.2"
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the backend with a mixed workload and report latency/throughput")
+    parser.add_argument("--url", help="Existing backend to target (default: start one on synthetic models)")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. predict=0.5,grsi=0.2,company_risk=0.15,plots=0.15")
+    parser.add_argument("--days", type=int, nargs=2, default=list(DEFAULT_DAYS), metavar=("MIN", "MAX"))
+    parser.add_argument("--companies", nargs="*")
+    parser.add_argument("--env", nargs="*", default=[], help="Extra backend env vars, KEY=VALUE")
+    parser.add_argument("--asgi", action="store_true", help="Start the ASGI backend (backend/app_asgi.py) instead of Flask")
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    companies = args.companies or list(forecasting.MODELS.keys())
+    proc, work_dir = None, None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        work_dir = tempfile.mkdtemp(prefix="loadtest-")
+        make_synthetic_backend(work_dir, companies)
+        env = dict(kv.split("=", 1) for kv in args.env)
+        proc, base_url = start_backend(work_dir, args.port, env, app_module="app_asgi" if args.asgi else "app",
+                                       asgi=args.asgi)
+
+    try:
+        # warm up: one predict per ticker so plots exist and first-call costs are excluded
+        for company in companies:
+            http("POST", f"{base_url}/predict", {"company": company, "days": 1})
+        report = run_load(base_url, companies, args.mix, args.concurrency, args.duration, tuple(args.days),
+                          server_pid=proc.pid if proc else None)
+    finally:
+        if proc:
+            stop_backend(proc)
+
+    report["config"] = {"concurrency": args.concurrency, "duration": args.duration, "mix": args.mix,
+                        "days": args.days, "asgi": args.asgi, "target": args.url or f"synthetic ({work_dir})"}
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,129 @@
+import os
+import sys
+import glob
+import threading
+import tracemalloc
+
+
+# ------------------------
+# Process memory
+# ------------------------
+def rss_bytes(pid=None):
+    pid = pid or os.getpid()
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(pid=None):
+    # direct children, e.g. the inference worker processes; /proc lists children per
+    # thread, and a child started from any thread of pid is only under that thread's entry
+    pid = pid or os.getpid()
+    try:
+        import psutil
+        return [child.pid for child in psutil.Process(pid).children()]
+    except ImportError:
+        pass
+    except Exception:
+        return []
+    pids = []
+    for path in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(path) as f:
+                pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            continue
+    return sorted(set(pids))
+
+
+def mb(value):
+    return round(value / (1024 * 1024), 2) if value is not None else None
+
+
+# ------------------------
+# Python heap (tracemalloc, when tracing) and TensorFlow allocator stats
+# ------------------------
+def heap_stats(top=10):
+    if not tracemalloc.is_tracing():
+        return None
+    current, peak = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:top]
+    return {
+        "current_mb": mb(current),
+        "peak_mb": mb(peak),
+        "top": [{"where": str(s.traceback[0]), "size_mb": mb(s.size), "count": s.count} for s in stats],
+    }
+
+
+def tf_allocator_stats():
+    # only when TensorFlow is already imported; CPU devices usually have no allocator stats
+    tf = sys.modules.get("tensorflow")
+    if tf is None:
+        return None
+    stats = {}
+    for device in tf.config.list_logical_devices():
+        try:
+            info = tf.config.experimental.get_memory_info(device.name)
+        except (ValueError, RuntimeError, AttributeError):
+            continue
+        stats[device.name] = {"current_mb": mb(info.get("current")), "peak_mb": mb(info.get("peak"))}
+    return stats
+
+
+# ------------------------
+# Per-ticker accounting: byte size of each ticker's loaded artifacts and the RSS
+# growth observed across its loads (concurrent loads overlap, so the growth split
+# between tickers is approximate; the total matches the process)
+# ------------------------
+def model_bytes(model):
+    if hasattr(model, "tensors") and hasattr(model, "layers"):
+        # utils.modelpack.PackedModel: file-backed mapping, shared between processes
+        return sum(model.tensors[name].nbytes for layer in model.layers for name in layer["weights"])
+    if hasattr(model, "get_weights"):
+        return sum(w.nbytes for w in model.get_weights())
+    # utils.global_model.TickerModel: weights belong to the shared model
+    return 0
+
+
+class TickerMemory:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tickers = {}
+
+    def loaded(self, company, model, data_scaled, rss_before):
+        rss_after = rss_bytes()
+        delta = rss_after - rss_before if rss_after is not None and rss_before is not None else 0
+        with self.lock:
+            row = self.tickers.setdefault(company, {"loads": 0, "rss_growth": 0, "last_rss_delta": 0,
+                                                    "model_bytes": 0, "dataset_bytes": 0})
+            row["loads"] += 1
+            row["rss_growth"] += delta
+            row["last_rss_delta"] = delta
+            if model is not None:
+                row["model_bytes"] = model_bytes(model)
+            row["dataset_bytes"] = int(getattr(data_scaled, "nbytes", 0))
+
+    def report(self):
+        with self.lock:
+            return {
+                company: {
+                    "loads": row["loads"],
+                    "rss_growth_mb": mb(row["rss_growth"]),
+                    "last_rss_delta_mb": mb(row["last_rss_delta"]),
+                    "model_mb": mb(row["model_bytes"]),
+                    "dataset_mb": mb(row["dataset_bytes"]),
+                }
+                for company, row in self.tickers.items()
+            }
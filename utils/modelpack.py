@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import struct
+import hashlib
+import logging
+import argparse
+import traceback
+
+import numpy as np
+
+from utils import forecasting
+
+
+# ------------------------
+# Model-pack layout (one file per deployment)
+#
+#   b"SFPACK01" | uint64 header length | JSON header | padding | tensor data
+#
+# Every tensor starts on a 64-byte boundary of the data region, so the whole file
+# can be np.memmap'ed and each weight is a zero-copy view into the mapping.
+# ------------------------
+MAGIC = b"SFPACK01"
+ALIGN = 64
+PACK_PATH = os.path.join(forecasting.BACKEND_DIR, "models.pack")
+
+
+def _pad(n):
+    return (ALIGN - n % ALIGN) % ALIGN
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ------------------------
+# Numpy forward pass (Keras Sequential: LSTM / Dense / Dropout)
+# ------------------------
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    None: lambda x: x,
+    "tanh": np.tanh,
+    "sigmoid": sigmoid,
+    "hard_sigmoid": hard_sigmoid,
+    "relu": lambda x: np.maximum(x, 0.0),
+}
+
+
+def lstm_forward(X, kernel, recurrent_kernel, bias, activation, recurrent_activation, return_sequences):
+    # Keras gate order: input, forget, cell, output
+    batch, steps, _ = X.shape
+    units = recurrent_kernel.shape[0]
+    act = ACTIVATIONS[activation]
+    rec_act = ACTIVATIONS[recurrent_activation]
+
+    # input projection for all timesteps in one matmul
+    xw = X @ kernel + bias
+    h = np.zeros((batch, units), dtype=X.dtype)
+    c = np.zeros((batch, units), dtype=X.dtype)
+    outputs = np.empty((batch, steps, units), dtype=X.dtype) if return_sequences else None
+    for t in range(steps):
+        z = xw[:, t, :] + h @ recurrent_kernel
+        i = rec_act(z[:, :units])
+        f = rec_act(z[:, units:2 * units])
+        g = act(z[:, 2 * units:3 * units])
+        o = rec_act(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * act(c)
+        if return_sequences:
+            outputs[:, t, :] = h
+    return outputs if return_sequences else h
+
+
+class PackedModel:
+    # drop-in for the subset of the Keras API the backend uses: predict(X, verbose=0)
+    def __init__(self, layers, tensors):
+        self.layers = layers
+        self.tensors = tensors
+
+    def weights(self, layer):
+        # float16 weights are upcast per call; the mapping itself stays shared and read-only
+        return [np.asarray(self.tensors[name], dtype=np.float32) for name in layer["weights"]]
+
+    def predict(self, X, verbose=0, batch_size=None):
+        out = np.asarray(X, dtype=np.float32)
+        for layer in self.layers:
+            if layer["type"] == "lstm":
+                kernel, recurrent_kernel, bias = self.weights(layer)
+                out = lstm_forward(out, kernel, recurrent_kernel, bias, layer["activation"],
+                                   layer["recurrent_activation"], layer["return_sequences"])
+            elif layer["type"] == "dense":
+                kernel, bias = self.weights(layer)
+                out = ACTIVATIONS[layer["activation"]](out @ kernel + bias)
+        return out
+
+
+class PackedScaler:
+    # MinMaxScaler parameters: X_scaled = X * scale_ + min_
+    def __init__(self, min_, scale_):
+        self.min_ = np.asarray(min_, dtype=np.float64)
+        self.scale_ = np.asarray(scale_, dtype=np.float64)
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+# ------------------------
+# Extract weights from Keras models / sklearn scalers
+# ------------------------
+def extract_layers(model, prefix, dtype):
+    layers, tensors = [], {}
+    for idx, layer in enumerate(model.layers):
+        kind = type(layer).__name__
+        config = layer.get_config()
+        names = []
+        if kind == "LSTM":
+            if not config.get("use_bias", True):
+                raise ValueError(f"{prefix}: LSTM without bias is not supported")
+            for w_name, w in zip(("kernel", "recurrent_kernel", "bias"), layer.get_weights()):
+                names.append(f"{prefix}/{idx}/{w_name}")
+                tensors[names[-1]] = np.asarray(w, dtype=dtype)
+            layers.append({
+                "type": "lstm",
+                "units": int(config["units"]),
+                "activation": config.get("activation", "tanh"),
+                "recurrent_activation": config.get("recurrent_activation", "sigmoid"),
+                "return_sequences": bool(config.get("return_sequences", False)),
+                "weights": names,
+            })
+        elif kind == "Dense":
+            weights = layer.get_weights()
+            if len(weights) == 1:
+                weights.append(np.zeros(weights[0].shape[1]))
+            for w_name, w in zip(("kernel", "bias"), weights):
+                names.append(f"{prefix}/{idx}/{w_name}")
+                tensors[names[-1]] = np.asarray(w, dtype=dtype)
+            layers.append({"type": "dense", "activation": config.get("activation", "linear"), "weights": names})
+        elif kind in ("Dropout", "InputLayer"):
+            # identity at inference time
+            continue
+        else:
+            raise ValueError(f"{prefix}: unsupported layer type {kind}")
+    return layers, tensors
+
+
+def extract_scaler(scaler, prefix):
+    if not hasattr(scaler, "min_") or not hasattr(scaler, "scale_"):
+        raise ValueError(f"{prefix}: only MinMaxScaler-style scalers (min_, scale_) can be packed")
+    return {
+        f"{prefix}/scaler/min": np.asarray(scaler.min_, dtype=np.float64),
+        f"{prefix}/scaler/scale": np.asarray(scaler.scale_, dtype=np.float64),
+    }
+
+
+# ------------------------
+# Write / read
+# ------------------------
+def write_pack(path, tickers, tensors, dtype_name):
+    table, offset = {}, 0
+    for name, arr in tensors.items():
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes + _pad(arr.nbytes)
+
+    header = json.dumps({
+        "version": 1,
+        "dtype": dtype_name,
+        "created": time.time(),
+        "tickers": tickers,
+        "tensors": table,
+    }).encode("utf-8")
+    prefix_len = len(MAGIC) + 8 + len(header)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * _pad(prefix_len))
+        for arr in tensors.values():
+            f.write(np.ascontiguousarray(arr).tobytes())
+            f.write(b"\0" * _pad(arr.nbytes))
+    os.replace(tmp_path, path)
+    return path
+
+
+class ModelPack:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a model pack")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        data_start = len(MAGIC) + 8 + header_len
+        data_start += _pad(data_start)
+
+        self.header = header
+        self.tickers = header["tickers"]
+        self._mmap = np.memmap(path, dtype=np.uint8, mode="r")
+        self.tensors = {}
+        for name, spec in header["tensors"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            count = int(np.prod(spec["shape"])) if spec["shape"] else 1
+            view = self._mmap[start:start + count * dtype.itemsize].view(dtype)
+            self.tensors[name] = view.reshape(spec["shape"])
+
+    def __contains__(self, company):
+        return company in self.tickers
+
+    def companies(self):
+        return list(self.tickers)
+
+    def model(self, company):
+        return PackedModel(self.tickers[company]["layers"], self.tensors)
+
+    def scaler(self, company):
+        meta = self.tickers[company]
+        return PackedScaler(self.tensors[meta["scaler"]["min"]], self.tensors[meta["scaler"]["scale"]])
+
+    def metadata(self, company):
+        meta = self.tickers[company]
+        return {k: meta[k] for k in ("seq_length", "n_features", "horizon", "source", "sha256") if k in meta}
+
+
+def open_pack(path):
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        start = time.perf_counter()
+        pack = ModelPack(path)
+        logging.info(f"Mapped model pack {path} ({len(pack.tickers)} tickers) in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return pack
+    except Exception:
+        logging.error(f"Failed to open model pack {path}:\n{traceback.format_exc()}")
+        return None
+
+
+# ------------------------
+# Build + verify against the original .h5 models
+# ------------------------
+def build_pack(out, companies=None, base_dir=forecasting.BACKEND_DIR, float16=False):
+    dtype = np.float16 if float16 else np.float32
+    tickers, tensors = {}, {}
+    for company in companies or forecasting.MODELS.keys():
+        source = forecasting.model_source(company, base_dir)
+        model_path = forecasting.resolve(source, base_dir)
+        scaler_path = forecasting.resolve(forecasting.SCALERS[company], base_dir)
+        try:
+            model = forecasting.load_model(model_path)
+            scaler = forecasting.load_pickle(scaler_path)
+            layers, layer_tensors = extract_layers(model, company, dtype)
+            scaler_tensors = extract_scaler(scaler, company)
+        except Exception:
+            logging.error(f"Skipping {company}:\n{traceback.format_exc()}")
+            continue
+        tensors.update(layer_tensors)
+        tensors.update(scaler_tensors)
+        tickers[company] = {
+            "seq_length": int(model.input_shape[1] or forecasting.SEQ_LENGTH),
+            "n_features": int(model.input_shape[2]),
+            "source": source,
+            "horizon": int(model.output_shape[-1]),
+            "sha256": file_sha256(model_path),
+            "layers": layers,
+            "scaler": {"min": f"{company}/scaler/min", "scale": f"{company}/scaler/scale"},
+        }
+        logging.info(f"Packed {company} ({len(layers)} layers)")
+    write_pack(out, tickers, tensors, "float16" if float16 else "float32")
+    return tickers
+
+
+def verify_pack(path, base_dir=forecasting.BACKEND_DIR, tolerance=None, samples=256):
+    # compares one-step predictions (scaled space) of the pack vs the original .h5 on real windows
+    pack = ModelPack(path)
+    if tolerance is None:
+        tolerance = 5e-3 if pack.header["dtype"] == "float16" else 1e-4
+    report = {}
+    for company in pack.companies():
+        data_scaled = forecasting.load_dataset(forecasting.resolve(forecasting.DATASETS[company], base_dir))
+        X, _ = forecasting.build_windows(data_scaled, pack.tickers[company]["seq_length"])
+        X = np.ascontiguousarray(X[-samples:])
+        reference = forecasting.load_model(forecasting.resolve(pack.tickers[company]["source"], base_dir))
+        expected = np.asarray(reference.predict(X, verbose=0)).reshape(len(X), -1)
+        actual = pack.model(company).predict(X).reshape(len(X), -1)
+        max_err = float(np.max(np.abs(expected - actual)))
+        report[company] = {"max_abs_error": max_err, "ok": max_err <= tolerance}
+        logging.info(f"{company}: max abs error {max_err:.2e} ({'ok' if max_err <= tolerance else 'FAIL'})")
+    return report
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and verify model packs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Pack all tickers' .h5 weights and scalers into one file")
+    build.add_argument("--base-dir", default=forecasting.BACKEND_DIR)
+    build.add_argument("--out", default=PACK_PATH)
+    build.add_argument("--float16", action="store_true", help="Store weights as float16")
+    build.add_argument("--companies", nargs="*")
+    build.add_argument("--verify", action="store_true", help="Check the pack against the .h5 models afterwards")
+
+    check = sub.add_parser("verify", help="Compare a pack's predictions with the original .h5 models")
+    check.add_argument("pack", nargs="?", default=PACK_PATH)
+    check.add_argument("--base-dir", default=forecasting.BACKEND_DIR)
+    check.add_argument("--tolerance", type=float)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        tickers = build_pack(args.out, args.companies, args.base_dir, args.float16)
+        logging.info(f"Wrote {len(tickers)} tickers to {args.out} ({os.path.getsize(args.out) / 1024:.0f} KiB)")
+        if not args.verify:
+            return 0
+        report = verify_pack(args.out, args.base_dir)
+    else:
+        report = verify_pack(args.pack, args.base_dir, args.tolerance)
+    return 0 if all(r["ok"] for r in report.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
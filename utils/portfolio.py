@@ -0,0 +1,89 @@
+import numpy as np
+
+
+# ------------------------
+# Portfolio aggregation over T tickers: all array ops on (T, H) forecast paths
+# and (T, L) return histories
+# ------------------------
+LOOKBACK = 252
+TRADING_DAYS = 252
+
+
+def normalize_weights(weights):
+    w = np.asarray(weights, dtype=float)
+    total = w.sum()
+    if not np.isfinite(total) or total == 0:
+        raise ValueError("weights must sum to a non-zero value")
+    return w / total
+
+
+def value_path(paths, last_close, weights, investment=1.0):
+    # each ticker's path relative to its last close, weighted -> portfolio value over the horizon
+    relative = paths / last_close[:, np.newaxis]
+    return investment * (weights @ relative)
+
+
+# The stored scaled series carry no dates, so histories are aligned by row from their
+# latest close backwards. Tickers on exchanges with different holidays (NSE, HKEX, TSE,
+# NYSE) can pair returns from different dates; the response says so (RETURN_ALIGNMENT)
+RETURN_ALIGNMENT = "last rows (series have no dates; exchange holidays are not aligned)"
+
+
+def log_returns(histories, lookback=LOOKBACK):
+    # histories: list of 1-D close series (different lengths) -> (T, L) aligned on their tails
+    length = min(min(len(h) for h in histories) - 1, lookback)
+    if length < 2:
+        raise ValueError("Not enough history for return statistics")
+    closes = np.stack([np.asarray(h[-(length + 1):], dtype=float) for h in histories])
+    return np.diff(np.log(closes), axis=1)
+
+
+def risk_stats(returns, weights):
+    cov = np.atleast_2d(np.cov(returns))
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.where(np.outer(std, std) > 0, cov / np.outer(std, std), 0.0)
+    np.fill_diagonal(corr, 1.0)
+    volatility = float(np.sqrt(max(weights @ cov @ weights, 0.0)) * np.sqrt(TRADING_DAYS))
+    return corr, volatility, std * np.sqrt(TRADING_DAYS)
+
+
+def weighted_score(values, weights):
+    # weight-average over tickers with a score (None -> excluded, remaining weights renormalized)
+    values = np.array([np.nan if v is None else v for v in values], dtype=float)
+    mask = ~np.isnan(values)
+    if not mask.any():
+        return None
+    w = np.abs(weights[mask])
+    return float((w @ values[mask]) / w.sum()) if w.sum() else None
+
+
+def aggregate(companies, weights, paths, last_close, histories, company_risk, country_grsi,
+              investment=1.0, lookback=LOOKBACK):
+    if not np.isfinite(investment) or investment <= 0:
+        raise ValueError("investment must be a positive number")
+    weights = normalize_weights(weights)
+    paths = np.asarray(paths, dtype=float)
+    last_close = np.asarray(last_close, dtype=float)
+
+    values = value_path(paths, last_close, weights, investment)
+    corr, volatility, ticker_vol = risk_stats(log_returns(histories, lookback), weights)
+    return {
+        "companies": list(companies),
+        "weights": weights.tolist(),
+        "investment": investment,
+        "value_path": values.tolist(),
+        "low_likely": float(values.min()),
+        "high_likely": float(values.max()),
+        "expected_return_pct": float((values[-1] / investment - 1) * 100),
+        "volatility_annual": volatility,
+        "correlation": corr.tolist(),
+        "return_alignment": RETURN_ALIGNMENT,
+        "grsi_risk": weighted_score(company_risk, weights),
+        "country_grsi_risk": weighted_score(country_grsi, weights),
+        "per_ticker": {
+            company: {"weight": float(w), "last_close": float(lc), "forecast": path.tolist(),
+                      "volatility_annual": float(v)}
+            for company, w, lc, path, v in zip(companies, weights, last_close, paths, ticker_vol)
+        },
+    }
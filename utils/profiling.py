@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import random
+import pstats
+import cProfile
+import threading
+import itertools
+from collections import Counter
+
+
+# ------------------------
+# Defaults
+# ------------------------
+SAMPLE_INTERVAL = 0.005
+MAX_FILES = 200
+MAX_BYTES = 50 * 1024 * 1024
+# hard ceiling for max_per_minute, whatever the admin endpoint is sent
+MAX_PER_MINUTE = 60
+
+
+# ------------------------
+# Sampling profiler for one thread: folded stacks ("a;b;c 12"), flamegraph.pl / speedscope compatible
+# ------------------------
+class StackSampler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ------------------------
+# Opt-in request profiler with rate limiting and a bounded output directory
+# ------------------------
+class RequestProfiler:
+    def __init__(self, directory, mode="sample", sample_rate=0.0, max_per_minute=6,
+                 max_files=MAX_FILES, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.mode = mode
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.max_per_minute = min(max(int(max_per_minute), 0), MAX_PER_MINUTE)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.cprofile_lock = threading.Lock()
+        self.recent = []
+        self.ids = itertools.count()
+        os.makedirs(directory, exist_ok=True)
+
+    def configure(self, enabled=None, sample_rate=None, mode=None, max_per_minute=None):
+        with self.lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_rate is not None:
+                self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+            if mode in ("sample", "cprofile"):
+                self.mode = mode
+            if max_per_minute is not None:
+                self.max_per_minute = min(max(int(max_per_minute), 0), MAX_PER_MINUTE)
+            return self.settings()
+
+    def settings(self):
+        return {"enabled": self.enabled, "sample_rate": self.sample_rate, "mode": self.mode,
+                "max_per_minute": self.max_per_minute, "directory": self.directory}
+
+    def wanted(self, forced=False):
+        # forced = explicit request header; otherwise the admin toggle + sampling rate decide
+        if not forced and not (self.enabled and random.random() < self.sample_rate):
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.recent = [t for t in self.recent if now - t < 60]
+            if len(self.recent) >= self.max_per_minute:
+                return False
+            self.recent.append(now)
+            return True
+
+    def run(self, name, fn, *args, **kwargs):
+        # returns (fn's result, profile filename); cProfile allows one active profiler
+        # per process, so a concurrent cprofile request falls back to stack sampling
+        base = f"{time.strftime('%Y%m%d-%H%M%S')}_{name}_{next(self.ids)}"
+        if self.mode == "cprofile" and self.cprofile_lock.acquire(blocking=False):
+            filename = base + ".prof"
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                try:
+                    result = fn(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    pstats.Stats(profiler).dump_stats(os.path.join(self.directory, filename))
+            finally:
+                self.cprofile_lock.release()
+        else:
+            filename = base + ".folded"
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                sampler.stop()
+                with open(os.path.join(self.directory, filename), "w") as f:
+                    f.write(sampler.folded())
+        self.prune()
+        return result, filename
+
+    def prune(self):
+        # keep the newest files within max_files / max_bytes
+        files = self.list()
+        total = 0
+        for i, entry in enumerate(files):
+            total += entry["bytes"]
+            if i >= self.max_files or total > self.max_bytes:
+                try:
+                    os.remove(os.path.join(self.directory, entry["name"]))
+                except OSError:
+                    pass
+
+    def list(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith((".prof", ".folded")):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append({"name": name, "bytes": stat.st_size, "created": stat.st_mtime})
+        return sorted(entries, key=lambda e: e["created"], reverse=True)
+
+    def path(self, name):
+        # only bare names of files this profiler wrote
+        if os.path.basename(name) != name or not name.endswith((".prof", ".folded")):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
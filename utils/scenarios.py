@@ -0,0 +1,98 @@
+import math
+import itertools
+
+import numpy as np
+
+from utils import forecasting
+
+
+# ------------------------
+# Perturbations applied to the last seq_length-row input window (in price space):
+#   close_gap    -> gap on the latest Close, e.g. -0.05 for a -5% gap (MA50/MA200 move with it)
+#   volatility   -> multiplier on the window's Close dispersion around its mean and on Volatility
+#   grsi_stress  -> multiplier k on the company's normalized GRSI (g in [0, 1]): adds a
+#                   -k * g * GRSI_DRAWDOWN gap and scales volatility by (1 + k * g)
+# ------------------------
+GRSI_DRAWDOWN = 0.10
+SCENARIO_KEYS = ("close_gap", "volatility", "grsi_stress")
+
+
+def expand_grid(grid):
+    # {"close_gap": [-0.05, 0], "volatility": [1, 2]} -> cartesian product of scenarios
+    keys = [k for k in SCENARIO_KEYS if k in grid]
+    values = [grid[k] if isinstance(grid[k], list) else [grid[k]] for k in keys]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def grid_size(grid):
+    # number of scenarios expand_grid would build, without building them
+    size = 1
+    for k in SCENARIO_KEYS:
+        if k in grid:
+            size *= len(grid[k]) if isinstance(grid[k], list) else 1
+    return size
+
+
+def validate(scenarios):
+    # parameters as finite floats; raises ValueError / TypeError otherwise, before any rollout runs
+    # (NaN / Infinity would end up in the response, which is not valid JSON)
+    cleaned = []
+    for scenario in scenarios:
+        params = {k: float(scenario[k]) for k in SCENARIO_KEYS if k in scenario}
+        bad = [k for k, v in params.items() if not math.isfinite(v)]
+        if bad:
+            raise ValueError(f"{', '.join(bad)} must be finite")
+        cleaned.append(dict(scenario, **params))
+    return cleaned
+
+
+def scenario_name(scenario):
+    parts = [f"{k}={scenario[k]:g}" for k in SCENARIO_KEYS if k in scenario]
+    return scenario.get("name") or (",".join(parts) if parts else "baseline")
+
+
+def perturb(raw_window, scenario, grsi_norm=0.0):
+    window = np.array(raw_window, dtype=float)
+    gap = float(scenario.get("close_gap", 0.0))
+    vol = float(scenario.get("volatility", 1.0))
+    stress = float(scenario.get("grsi_stress", 0.0)) * grsi_norm
+    gap -= stress * GRSI_DRAWDOWN
+    vol *= 1.0 + stress
+
+    close = window[:, 0]
+    if vol != 1.0:
+        mean = close.mean()
+        close[:] = mean + vol * (close - mean)
+        if window.shape[1] >= 4:
+            window[:, 3] *= vol
+    if gap:
+        delta = close[-1] * gap
+        close[-1] += delta
+        if window.shape[1] >= 4:
+            window[-1, 1] += delta / 50
+            window[-1, 2] += delta / 200
+    return window
+
+
+def run_scenarios(model, scaler, window_scaled, days, scenarios, grsi_norm=0.0, deadline=None):
+    # every scenario's rollout advances together as one (S, seq_length, n_features) batch
+    n_features = window_scaled.shape[1]
+    raw_window = scaler.inverse_transform(window_scaled)
+    batch = np.stack([scaler.transform(perturb(raw_window, s, grsi_norm)) for s in scenarios])
+    paths_scaled = forecasting.rollout_batch(model, batch, days, deadline)
+    paths = forecasting.inverse_close(scaler, paths_scaled.ravel(), n_features).reshape(paths_scaled.shape)
+
+    last_close = float(raw_window[-1, 0])
+    results = []
+    for scenario, path in zip(scenarios, paths):
+        results.append({
+            "name": scenario_name(scenario),
+            "params": {k: scenario[k] for k in SCENARIO_KEYS if k in scenario},
+            "forecast": path.tolist(),
+            "low_likely": float(path.min()),
+            "high_likely": float(path.max()),
+            "mean": float(path.mean()),
+            "end": float(path[-1]),
+            "change_pct": float((path[-1] / last_close - 1) * 100) if last_close else None,
+        })
+    return {"last_close": last_close, "scenarios": results}
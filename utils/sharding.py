@@ -0,0 +1,120 @@
+import time
+import bisect
+import hashlib
+import logging
+import argparse
+import tempfile
+
+from utils import forecasting
+
+
+# ------------------------
+# Consistent-hash ring with virtual nodes: adding/removing a node only moves
+# the tickers that hash next to it (~1/N of the universe)
+# ------------------------
+VNODES = 64
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes=(), vnodes=VNODES):
+        self.vnodes = vnodes
+        self.nodes = set()
+        self.points = []
+        self.owners = []
+        for node in nodes:
+            self.add(node)
+
+    def _rebuild(self):
+        ring = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(self.vnodes))
+        self.points = [p for p, _ in ring]
+        self.owners = [n for _, n in ring]
+
+    def add(self, node):
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self._rebuild()
+
+    def remove(self, node):
+        if node in self.nodes:
+            self.nodes.discard(node)
+            self._rebuild()
+
+    def walk(self, key):
+        # distinct nodes in ring order starting at the key's position
+        if not self.owners:
+            return []
+        start = bisect.bisect(self.points, _hash(key)) % len(self.points)
+        seen = []
+        for i in range(len(self.owners)):
+            node = self.owners[(start + i) % len(self.owners)]
+            if node not in seen:
+                seen.append(node)
+                if len(seen) == len(self.nodes):
+                    break
+        return seen
+
+    def nodes_for(self, key, replicas=1):
+        return self.walk(key)[:replicas]
+
+
+def assign(companies, nodes, replicas=1):
+    # initial SHARD_TICKERS per node: each company goes to its `replicas` ring successors
+    # (the same placement backend/router.py keeps with ROUTER_REPLICAS as nodes come and go)
+    ring = HashRing(nodes)
+    shards = {node: [] for node in nodes}
+    for company in companies:
+        for node in ring.nodes_for(company, replicas):
+            shards[node].append(company)
+    return shards
+
+
+# ------------------------
+# CLI: run N backend nodes + the router on one machine
+# ------------------------
+def main(argv=None):
+    from utils.loadtest import start_backend, stop_backend
+    from utils.synthetic import make_synthetic_backend
+
+    parser = argparse.ArgumentParser(description="Run a local sharded deployment (N backend nodes + router)")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--replicas", type=int, default=2, help="Nodes serving each ticker")
+    parser.add_argument("--base-port", type=int, default=5101)
+    parser.add_argument("--router-port", type=int, default=5000)
+    parser.add_argument("--work-dir", help="Backend tree to serve (default: synthetic models)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    work_dir = args.work_dir
+    if not work_dir:
+        work_dir = tempfile.mkdtemp(prefix="shards-")
+        make_synthetic_backend(work_dir)
+
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(args.nodes)]
+    shards = assign(forecasting.MODELS.keys(), urls, args.replicas)
+    procs = []
+    try:
+        for url in urls:
+            port = int(url.rsplit(":", 1)[1])
+            proc, _ = start_backend(work_dir, port, {"SHARD_TICKERS": ",".join(shards[url])})
+            procs.append(proc)
+            logging.info(f"Node {url}: {shards[url]}")
+        router_env = {"ROUTER_NODES": ",".join(urls), "ROUTER_REPLICAS": str(args.replicas)}
+        proc, router_url = start_backend(work_dir, args.router_port, router_env, app_module="router")
+        procs.append(proc)
+        logging.info(f"Router on {router_url} (Ctrl-C to stop)")
+        while all(p.poll() is None for p in procs):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs:
+            stop_backend(proc)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
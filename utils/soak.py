@@ -0,0 +1,184 @@
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from utils import forecasting
+from utils import memory
+from utils.loadtest import http, start_backend, stop_backend
+from utils.synthetic import MODEL_FORMATS, make_synthetic_backend
+
+
+# ------------------------
+# Memory soak test: replay /predict across every company for hours and sample
+# the backend's memory (RSS incl. worker processes, tracemalloc heap, TF allocator,
+# per-ticker attribution from /admin/memory) at a fixed interval. Growth is the
+# slope of a straight-line fit after the warmup share of the run. The synthetic
+# backend defaults to Keras .h5 models, so every request goes through
+# tf.keras.models.load_model (the per-request load path whose creep is measured)
+# and TensorFlow's allocator is live; --models pack soaks the NumPy pack instead.
+# ------------------------
+SOAK_ENV = {"MEMORY_TRACE": "1"}
+
+
+def sample(base_url, server_pid, start):
+    row = {"t": round(time.monotonic() - start, 1)}
+    if server_pid:
+        children = memory.child_pids(server_pid)
+        row["rss_mb"] = memory.mb(memory.rss_bytes(server_pid))
+        row["children_rss_mb"] = memory.mb(sum(memory.rss_bytes(pid) or 0 for pid in children))
+    try:
+        status, body = http("GET", f"{base_url}/admin/memory?top=5", timeout=30)
+        snap = json.loads(body) if status == 200 else {}
+    except (OSError, ValueError):
+        snap = {}
+    row.setdefault("rss_mb", snap.get("rss_mb"))
+    heap = snap.get("python_heap") or {}
+    row["heap_mb"] = heap.get("current_mb")
+    row["heap_top"] = heap.get("top")
+    row["tf_allocator"] = snap.get("tf_allocator")
+    row["tickers"] = {c: t.get("rss_growth_mb") for c, t in (snap.get("tickers") or {}).items()}
+    return row
+
+
+def soak(base_url, companies, duration, interval=30.0, concurrency=4, days_range=(1, forecasting.MAX_HORIZON),
+         server_pid=None, out=None, seed=0):
+    stop = threading.Event()
+    counts = {"ok": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def worker(idx):
+        # each worker walks the company list from its own offset, so every ticker stays in rotation
+        rng = random.Random(seed + idx)
+        step = idx
+        while not stop.is_set():
+            company = companies[step % len(companies)]
+            step += concurrency
+            try:
+                status, _ = http("POST", f"{base_url}/predict", {"company": company, "days": rng.randint(*days_range)})
+            except OSError:
+                status = 0
+            key = "ok" if status == 200 else "rejected" if status in (429, 503) else "errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+
+    samples = []
+    f = open(out, "a") if out else None
+    try:
+        while time.monotonic() - start < duration:
+            row = sample(base_url, server_pid, start)
+            with lock:
+                row["requests"] = dict(counts)
+            samples.append(row)
+            if f:
+                f.write(json.dumps(row) + "\n")
+                f.flush()
+            logging.info(f"t={row['t']}s rss={row['rss_mb']}MB heap={row['heap_mb']}MB requests={row['requests']}")
+            stop.wait(min(interval, max(0.0, duration - (time.monotonic() - start))))
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=120)
+        if f:
+            f.close()
+    samples.append(dict(sample(base_url, server_pid, start), requests=dict(counts)))
+    return samples
+
+
+def growth(samples, key, warmup=0.2):
+    # MB per hour after the warmup share of the run
+    points = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+    points = points[int(len(points) * warmup):]
+    if len(points) < 3:
+        return None
+    t, v = np.array(points, dtype=float).T
+    if t[-1] == t[0]:
+        return None
+    return round(float(np.polyfit(t / 3600.0, v, 1)[0]), 3)
+
+
+def summarize(samples, warmup=0.2):
+    def series(key):
+        values = [s[key] for s in samples if s.get(key) is not None]
+        if not values:
+            return None
+        return {"start": values[0], "end": values[-1], "peak": max(values),
+                "slope_mb_per_hour": growth(samples, key, warmup)}
+
+    final = samples[-1] if samples else {}
+    return {
+        "duration_s": final.get("t"),
+        "requests": final.get("requests"),
+        "rss_mb": series("rss_mb"),
+        "children_rss_mb": series("children_rss_mb"),
+        "heap_mb": series("heap_mb"),
+        "tf_allocator": final.get("tf_allocator"),
+        "ticker_rss_growth_mb": final.get("tickers"),
+        "heap_top": final.get("heap_top"),
+    }
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory soak test: replay /predict for hours and track memory")
+    parser.add_argument("--url", help="Existing backend (start it with MEMORY_TRACE=1); default: synthetic models")
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--hours", type=float, default=2.0)
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between memory samples")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--days", type=int, nargs=2, default=[1, forecasting.MAX_HORIZON], metavar=("MIN", "MAX"))
+    parser.add_argument("--companies", nargs="*")
+    parser.add_argument("--models", choices=MODEL_FORMATS, default="h5",
+                        help="Synthetic model format: h5 (Keras, per-request load_model) or pack")
+    parser.add_argument("--env", nargs="*", default=[], help="Extra backend env vars, KEY=VALUE")
+    parser.add_argument("--warmup", type=float, default=0.2, help="Share of the run excluded from the growth fit")
+    parser.add_argument("--max-growth", type=float, default=5.0, help="Allowed RSS growth in MB/hour")
+    parser.add_argument("--samples", default="soak_samples.jsonl", help="Append every sample here (JSON lines)")
+    parser.add_argument("--out", help="Write the summary JSON here")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    companies = args.companies or list(forecasting.MODELS.keys())
+    proc = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        work_dir = tempfile.mkdtemp(prefix="soak-")
+        make_synthetic_backend(work_dir, companies, model_format=args.models)
+        env = dict(SOAK_ENV, **dict(kv.split("=", 1) for kv in args.env))
+        proc, base_url = start_backend(work_dir, args.port, env)
+
+    try:
+        samples = soak(base_url, companies, args.hours * 3600, args.interval, args.concurrency, tuple(args.days),
+                       server_pid=proc.pid if proc else None, out=args.samples)
+    finally:
+        if proc:
+            stop_backend(proc)
+
+    report = summarize(samples, args.warmup)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    slope = (report["rss_mb"] or {}).get("slope_mb_per_hour")
+    if slope is not None and slope > args.max_growth:
+        logging.error(f"RSS grows {slope} MB/hour (limit {args.max_growth})")
+        return 1
+    logging.info(f"RSS growth {slope} MB/hour (limit {args.max_growth})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import itertools
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from utils import forecasting
+from utils import training
+from utils.workers import thread_env
+
+
+# ------------------------
+# Defaults
+# ------------------------
+DEFAULT_GRID = {
+    "seq_length": [30, 60, 90],
+    "units": [[64, 32], [100, 50], [128, 64]],
+    "dropout": [0.1, 0.2, 0.3],
+    "batch_size": [32, 64],
+}
+MAX_EPOCHS = training.EPOCHS
+PATIENCE = 10
+WARMUP_EPOCHS = 10
+CACHE_DIR = os.path.join(forecasting.BACKEND_DIR, "sweep_cache")
+
+
+def data_version(ticker, base_dir=forecasting.BACKEND_DIR):
+    # content hash of the ticker's stored scaled series: a refreshed dataset gets new cache
+    # files and new trial keys instead of reusing windows and scores from the old data
+    digest = hashlib.sha256()
+    with open(forecasting.resolve(forecasting.DATASETS[ticker], base_dir), "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def trial_key(ticker, config, version=""):
+    blob = json.dumps({"ticker": ticker, "data": version, **config}, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def grid_configs(grid, epochs, samples=None, seed=0):
+    keys = sorted(grid)
+    configs = [dict(zip(keys, combo), epochs=epochs) for combo in itertools.product(*(grid[k] for k in keys))]
+    if samples and samples < len(configs):
+        configs = random.Random(seed).sample(configs, samples)
+    return configs
+
+
+# ------------------------
+# Feature cache: each ticker's scaled series is written once as .npy and
+# memory-mapped by every trial process (shared page cache, no re-unpickling)
+# ------------------------
+def cache_series(ticker, base_dir, cache_dir, version):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{ticker.replace(' ', '_')}-{version}.npy")
+    if not os.path.isfile(path):
+        series = forecasting.load_dataset(forecasting.resolve(forecasting.DATASETS[ticker], base_dir))
+        np.save(path, series.astype(np.float32))
+    return path
+
+
+_series_cache = {}
+
+
+def cached_series(path):
+    if path not in _series_cache:
+        _series_cache[path] = training.load_series(path)
+    return _series_cache[path]
+
+
+# ------------------------
+# Pruning: median-stopping rule against finished trials of the same ticker
+# ------------------------
+def make_prune_callback(reference_curves, warmup=WARMUP_EPOCHS):
+    import tensorflow as tf
+
+    class MedianStopping(tf.keras.callbacks.Callback):
+        def __init__(self):
+            super().__init__()
+            self.pruned = False
+            self.best = np.inf
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.best = min(self.best, float((logs or {}).get("val_loss", np.inf)))
+            if epoch < warmup or not reference_curves:
+                return
+            # stop when our best-so-far is worse than the median best-so-far of finished trials at this epoch
+            ref = [min(curve[:epoch + 1]) for curve in reference_curves if curve]
+            if ref and self.best > float(np.median(ref)):
+                self.pruned = True
+                self.model.stop_training = True
+
+    return MedianStopping()
+
+
+def run_trial(ticker, config, series_path, reference_curves, patience=PATIENCE, seed=0, version=""):
+    import tensorflow as tf
+
+    start = time.perf_counter()
+    series = cached_series(series_path)
+    early = tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=patience, restore_best_weights=False)
+    prune = make_prune_callback(reference_curves)
+    _, history = training.train(series, seq_length=config["seq_length"], units=tuple(config["units"]),
+                                dropout=config["dropout"], epochs=config["epochs"],
+                                batch_size=config["batch_size"], seed=seed,
+                                callbacks=[early, prune], verbose=0)
+    val_loss = [float(v) for v in history["val_loss"]]
+    return {
+        "ticker": ticker,
+        "key": trial_key(ticker, config, version),
+        "data_version": version,
+        "config": config,
+        "best_val_loss": min(val_loss),
+        "epochs_run": len(val_loss),
+        "pruned": prune.pruned,
+        "early_stopped": len(val_loss) < config["epochs"] and not prune.pruned,
+        "val_loss": val_loss,
+        "seconds": round(time.perf_counter() - start, 1),
+    }
+
+
+# ------------------------
+# Results log: one JSON line per finished trial; re-runs skip known keys
+# ------------------------
+def load_results(path):
+    results = {}
+    if os.path.isfile(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    results[row["key"]] = row
+    return results
+
+
+def append_result(path, row):
+    with open(path, "a") as f:
+        f.write(json.dumps(row) + "\n")
+
+
+def sweep(tickers, configs, results_path, base_dir=forecasting.BACKEND_DIR, cache_dir=CACHE_DIR,
+          jobs=None, threads=1, patience=PATIENCE, seed=0):
+    done = load_results(results_path)
+    versions = {t: data_version(t, base_dir) for t in tickers}
+    queue = [(t, c) for t in tickers for c in configs if trial_key(t, c, versions[t]) not in done]
+    logging.info(f"{len(queue)} trials to run ({len(done)} already finished)")
+    if not queue:
+        return done
+
+    series_paths = {t: cache_series(t, base_dir, cache_dir, versions[t]) for t in tickers}
+    jobs = jobs or max(1, (os.cpu_count() or 1) // threads)
+    # spawned trial processes inherit the thread budget from the environment
+    os.environ.update(thread_env(threads))
+
+    def curves(ticker):
+        return [r["val_loss"] for r in done.values()
+                if r["ticker"] == ticker and r.get("data_version") == versions[ticker] and not r.get("pruned")]
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+        running = {}
+        while queue or running:
+            # keep `jobs` trials in flight so later trials prune against earlier finished ones
+            while queue and len(running) < jobs:
+                ticker, config = queue.pop(0)
+                future = pool.submit(run_trial, ticker, config, series_paths[ticker], curves(ticker), patience, seed,
+                                     versions[ticker])
+                running[future] = (ticker, config)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                ticker, config = running.pop(future)
+                try:
+                    row = future.result()
+                except Exception:
+                    logging.error(f"Trial {ticker} {config} failed:\n{traceback.format_exc()}")
+                    continue
+                done[row["key"]] = row
+                append_result(results_path, row)
+                status = "pruned" if row["pruned"] else f"{row['epochs_run']} epochs"
+                logging.info(f"{ticker} {config}: val_loss {row['best_val_loss']:.6f} ({status}, {row['seconds']}s)")
+    return done
+
+
+def best_by_ticker(results, versions=None):
+    # versions: {ticker: data_version} -> only trials on the current data count
+    best = {}
+    for row in results.values():
+        if row["pruned"]:
+            continue
+        if versions is not None and row.get("data_version") != versions.get(row["ticker"]):
+            continue
+        if row["ticker"] not in best or row["best_val_loss"] < best[row["ticker"]]["best_val_loss"]:
+            best[row["ticker"]] = row
+    return {t: {"config": r["config"], "best_val_loss": r["best_val_loss"]} for t, r in best.items()}
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep over the LSTM training pipeline")
+    parser.add_argument("--companies", nargs="*")
+    parser.add_argument("--base-dir", default=forecasting.BACKEND_DIR)
+    parser.add_argument("--grid", help="JSON file with lists for seq_length, units, dropout, batch_size")
+    parser.add_argument("--random", type=int, help="Sample this many configurations instead of the full grid")
+    parser.add_argument("--epochs", type=int, default=MAX_EPOCHS, help="Max epochs per trial")
+    parser.add_argument("--patience", type=int, default=PATIENCE)
+    parser.add_argument("--jobs", type=int, help="Parallel trial processes (default: cores / threads)")
+    parser.add_argument("--threads", type=int, default=1, help="Threads per trial process")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--results", default=os.path.join(forecasting.BACKEND_DIR, "sweep_results.jsonl"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    configs = grid_configs(grid, args.epochs, args.random, args.seed)
+    tickers = args.companies or list(forecasting.MODELS.keys())
+
+    results = sweep(tickers, configs, args.results, args.base_dir, args.cache_dir,
+                    args.jobs, args.threads, args.patience, args.seed)
+    versions = {t: data_version(t, args.base_dir) for t in tickers}
+    print(json.dumps(best_by_ticker(results, versions), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
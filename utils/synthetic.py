@@ -0,0 +1,136 @@
+import os
+import shutil
+import pickle
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils import forecasting
+from utils import ingest
+from utils import modelpack
+
+
+# ------------------------
+# Synthetic backend tree: random-walk price histories, the notebook feature
+# layout (Close, MA50, MA200, Volatility), MinMax scaling and random
+# LSTM(100) -> LSTM(50) -> Dense(1) weights, either as a model pack (no trained
+# .h5 files or TensorFlow needed) or as per-ticker Keras .h5 models + scaler
+# pickles, so the backend takes its real per-request load_model path
+# ------------------------
+UNITS = (100, 50)
+MODEL_FORMATS = ("pack", "h5")
+
+
+def synthetic_series(rows, rng, start=100.0):
+    close = start * np.exp(np.cumsum(rng.normal(0, 0.015, rows + 200)))
+    df = pd.DataFrame({"Close": close})
+    df["MA50"] = df["Close"].rolling(window=50).mean()
+    df["MA200"] = df["Close"].rolling(window=200).mean()
+    df["Volatility"] = df["Close"].pct_change().rolling(window=50).std() * ingest.VOL_ANNUALIZE
+    df.dropna(inplace=True)
+    raw = df[["Close", "MA50", "MA200", "Volatility"]].to_numpy()[-rows:]
+
+    data_min, data_max = raw.min(axis=0), raw.max(axis=0)
+    scale = 1.0 / np.where(data_max > data_min, data_max - data_min, 1.0)
+    min_ = -data_min * scale
+    return raw * scale + min_, min_, scale
+
+
+def synthetic_layers(prefix, n_features, rng, units=UNITS):
+    layers, tensors, inputs = [], {}, n_features
+    for idx, n_units in enumerate(units):
+        names = [f"{prefix}/{idx}/kernel", f"{prefix}/{idx}/recurrent_kernel", f"{prefix}/{idx}/bias"]
+        tensors[names[0]] = rng.normal(0, 1 / np.sqrt(inputs), (inputs, 4 * n_units)).astype(np.float32)
+        tensors[names[1]] = rng.normal(0, 1 / np.sqrt(n_units), (n_units, 4 * n_units)).astype(np.float32)
+        tensors[names[2]] = np.zeros(4 * n_units, dtype=np.float32)
+        layers.append({"type": "lstm", "units": n_units, "activation": "tanh", "recurrent_activation": "sigmoid",
+                       "return_sequences": idx < len(units) - 1, "weights": names})
+        inputs = n_units
+    names = [f"{prefix}/dense/kernel", f"{prefix}/dense/bias"]
+    tensors[names[0]] = rng.normal(0, 0.1, (inputs, 1)).astype(np.float32)
+    tensors[names[1]] = np.full(1, 0.5, dtype=np.float32)
+    layers.append({"type": "dense", "activation": "linear", "weights": names})
+    return layers, tensors
+
+
+def write_keras_ticker(out_dir, company, data_scaled, min_, scale, seed, units=UNITS):
+    # random-init notebook architecture saved as the ticker's .h5, plus a fitted MinMaxScaler
+    from sklearn.preprocessing import MinMaxScaler
+    from keras.utils import set_random_seed
+
+    from utils import training
+
+    raw = (data_scaled - min_) / scale
+    scaler = MinMaxScaler().fit(raw)
+    scaler_path = forecasting.resolve(forecasting.SCALERS[company], out_dir)
+    os.makedirs(os.path.dirname(scaler_path), exist_ok=True)
+    with open(scaler_path, "wb") as f:
+        pickle.dump(scaler, f)
+
+    set_random_seed(seed)
+    model = training.build_model(forecasting.SEQ_LENGTH, data_scaled.shape[1], units)
+    model_path = forecasting.resolve(forecasting.MODELS[company], out_dir)
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    model.save(model_path)
+
+
+def make_synthetic_backend(out_dir, companies=None, rows=1500, seed=0, units=UNITS, model_format="pack"):
+    # returns the model pack path, or None for model_format="h5"
+    if model_format not in MODEL_FORMATS:
+        raise ValueError(f"model_format must be one of {MODEL_FORMATS}")
+    rng = np.random.default_rng(seed)
+    companies = list(companies or forecasting.MODELS.keys())
+    for sub in ("scaled_data", "plots", "dataset"):
+        os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+    for name in ("company_risk.csv", "country_GRSI.csv"):
+        src = os.path.join(forecasting.BACKEND_DIR, "dataset", name)
+        if os.path.isfile(src):
+            shutil.copy(src, os.path.join(out_dir, "dataset", name))
+
+    tickers, tensors = {}, {}
+    for company in companies:
+        data_scaled, min_, scale = synthetic_series(rows, rng)
+        with open(forecasting.resolve(forecasting.DATASETS[company], out_dir), "wb") as f:
+            pickle.dump(data_scaled, f)
+        if model_format == "h5":
+            write_keras_ticker(out_dir, company, data_scaled, min_, scale, seed, units)
+            continue
+        layers, layer_tensors = synthetic_layers(company, data_scaled.shape[1], rng, units)
+        tensors.update(layer_tensors)
+        tensors[f"{company}/scaler/min"] = min_
+        tensors[f"{company}/scaler/scale"] = scale
+        tickers[company] = {
+            "seq_length": forecasting.SEQ_LENGTH,
+            "n_features": data_scaled.shape[1],
+            "source": "synthetic",
+            "sha256": f"synthetic-{seed}-{company}",
+            "layers": layers,
+            "scaler": {"min": f"{company}/scaler/min", "scale": f"{company}/scaler/scale"},
+        }
+    if model_format == "h5":
+        logging.info(f"Synthetic backend for {len(companies)} tickers (Keras .h5) in {out_dir}")
+        return None
+    pack_path = os.path.join(out_dir, "models.pack")
+    modelpack.write_pack(pack_path, tickers, tensors, "float32")
+    logging.info(f"Synthetic backend for {len(companies)} tickers in {out_dir}")
+    return pack_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create a synthetic backend tree (datasets + models)")
+    parser.add_argument("out_dir")
+    parser.add_argument("--rows", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--companies", nargs="*")
+    parser.add_argument("--models", choices=MODEL_FORMATS, default="pack",
+                        help="pack: NumPy model pack; h5: per-ticker Keras models (needs TensorFlow)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    make_synthetic_backend(args.out_dir, args.companies, args.rows, args.seed, model_format=args.models)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
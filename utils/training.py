@@ -0,0 +1,147 @@
+import os
+import logging
+import argparse
+
+import numpy as np
+
+from utils import forecasting
+
+
+# ------------------------
+# Defaults (same as the notebooks)
+# ------------------------
+UNITS = (100, 50)
+DROPOUT = 0.2
+EPOCHS = 150
+BATCH_SIZE = 32
+VAL_FRACTION = 0.2
+
+
+# ------------------------
+# Scaled series
+# ------------------------
+def load_series(path):
+    # .npy files are memory-mapped (large intraday histories); pickles go through load_dataset
+    if path.endswith(".npy"):
+        series = np.load(path, mmap_mode="r")
+        return series.reshape(-1, 1) if series.ndim == 1 else series
+    return forecasting.load_dataset(path)
+
+
+def split_indices(n_rows, seq_length=forecasting.SEQ_LENGTH, val_fraction=VAL_FRACTION, horizon=1):
+    # window k is series[k:k + seq_length] -> target series[k + seq_length:k + seq_length + horizon, 0];
+    # chronological split by window start, like train_test_split(shuffle=False)
+    n_windows = n_rows - seq_length - horizon + 1
+    if n_windows < 2:
+        raise ValueError(f"Not enough rows for training (need > {seq_length + horizon})")
+    cut = int(n_windows * (1 - val_fraction))
+    return np.arange(0, cut), np.arange(cut, n_windows)
+
+
+# ------------------------
+# Streaming windows: only window start indices are shuffled/batched; each batch
+# is gathered from the series on the fly (NumPy fancy indexing, so a memory-mapped
+# .npy only pages in the rows a batch touches) and prefetched, so memory stays at
+# O(a few batches) instead of O(seq_length * series)
+# ------------------------
+def gather_windows(series, starts, seq_length=forecasting.SEQ_LENGTH, horizon=1):
+    # windows series[k:k + seq_length] and their targets (next close, or the next `horizon` closes)
+    starts = np.asarray(starts, dtype=np.int64)
+    x = np.asarray(series[starts[:, np.newaxis] + np.arange(seq_length)], dtype=np.float32)
+    targets = starts[:, np.newaxis] + seq_length + np.arange(horizon)
+    y = np.asarray(series[targets, 0], dtype=np.float32)
+    return x, (y[:, 0] if horizon == 1 else y)
+
+
+def window_dataset(series, indices, seq_length=forecasting.SEQ_LENGTH, batch_size=BATCH_SIZE,
+                   shuffle=False, seed=None, horizon=1):
+    import tensorflow as tf
+
+    n_features = series.shape[1]
+
+    ds = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+    if shuffle:
+        ds = ds.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    def gather(idx):
+        x, y = tf.numpy_function(lambda i: gather_windows(series, i, seq_length, horizon), [idx],
+                                 (tf.float32, tf.float32))
+        x.set_shape([None, seq_length, n_features])
+        y.set_shape([None] if horizon == 1 else [None, horizon])
+        return x, y
+
+    return ds.map(gather, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+
+# ------------------------
+# Model
+# ------------------------
+def build_model(seq_length, n_features, units=UNITS, dropout=DROPOUT, horizon=1):
+    # horizon > 1 -> direct multi-horizon head: one output per forecast day
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense, Dropout, Input
+
+    model = Sequential()
+    model.add(Input(shape=(seq_length, n_features)))
+    for i, n_units in enumerate(units):
+        model.add(LSTM(units=n_units, return_sequences=i < len(units) - 1))
+        model.add(Dropout(dropout))
+    model.add(Dense(units=horizon))
+    model.compile(optimizer="adam", loss="mean_squared_error")
+    return model
+
+
+def train(series, seq_length=forecasting.SEQ_LENGTH, units=UNITS, dropout=DROPOUT, epochs=EPOCHS,
+          batch_size=BATCH_SIZE, val_fraction=VAL_FRACTION, seed=None, callbacks=None, verbose=1, horizon=1):
+    train_idx, val_idx = split_indices(len(series), seq_length, val_fraction, horizon)
+    train_ds = window_dataset(series, train_idx, seq_length, batch_size, shuffle=True, seed=seed, horizon=horizon)
+    val_ds = window_dataset(series, val_idx, seq_length, batch_size, horizon=horizon)
+
+    model = build_model(seq_length, series.shape[1], units, dropout, horizon)
+    history = model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=callbacks, verbose=verbose)
+    return model, history.history
+
+
+# ------------------------
+# CLI
+# ------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train a per-ticker LSTM from a stored scaled series")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--company", help="Company key (uses its scaled_data pickle)")
+    source.add_argument("--series", help="Path to a scaled series (.pkl or .npy)")
+    parser.add_argument("--base-dir", default=forecasting.BACKEND_DIR)
+    parser.add_argument("--out", help="Where to save the .h5 model (default: the company's model path)")
+    parser.add_argument("--seq-length", type=int, default=forecasting.SEQ_LENGTH)
+    parser.add_argument("--units", type=int, nargs="+", default=list(UNITS))
+    parser.add_argument("--dropout", type=float, default=DROPOUT)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--val-fraction", type=float, default=VAL_FRACTION)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--direct", action="store_true",
+                        help="Train a direct multi-horizon model (saved as *_direct.h5, picked up by the backend)")
+    parser.add_argument("--horizon", type=int, default=forecasting.MAX_HORIZON, help="Outputs of a --direct model")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.company:
+        series = load_series(forecasting.resolve(forecasting.DATASETS[args.company], args.base_dir))
+        out = args.out or forecasting.resolve(forecasting.MODELS[args.company], args.base_dir)
+    else:
+        series = load_series(args.series)
+        out = args.out or os.path.splitext(args.series)[0] + "_model.h5"
+    horizon = args.horizon if args.direct else 1
+    if args.direct and not args.out:
+        out = forecasting.direct_path(out)
+
+    model, history = train(series, args.seq_length, tuple(args.units), args.dropout, args.epochs,
+                           args.batch_size, args.val_fraction, args.seed, horizon=horizon)
+    model.save(out)
+    logging.info(f"Saved model to {out} (final val_loss {history['val_loss'][-1]:.6f})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
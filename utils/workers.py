@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import logging
+import itertools
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from utils import forecasting
+from utils import admission
+from utils.admission import Deadline, DeadlineExceeded, Rejected
+
+
+# ------------------------
+# Thread budget: must be in the environment before numpy/TensorFlow are imported,
+# so workers are spawned (not forked) with these variables set
+# ------------------------
+THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+
+def thread_env(threads):
+    env = {name: str(threads) for name in THREAD_ENV}
+    env["TF_NUM_INTEROP_THREADS"] = "1"
+    return env
+
+
+def configure_threads(threads, cores=None):
+    # in-process variant: env for libraries not imported yet, TF runtime config if it is
+    for name, value in thread_env(threads).items():
+        os.environ.setdefault(name, value)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    tf = sys.modules.get("tensorflow")
+    if tf is not None:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError:
+            # TF already initialized its pools; the env vars only apply to new processes
+            logging.warning("TensorFlow already initialized; thread settings not applied")
+
+
+class WorkerError(Exception):
+    pass
+
+
+CHECK_INTERVAL = 1.0
+
+
+# ------------------------
+# Worker process
+# ------------------------
+def worker_main(idx, tasks, results, base_dir, pack_path, threads, cores, global_path=None):
+    configure_threads(threads, cores)
+    from utils import modelpack
+    from utils import global_model
+    from utils import scenarios
+    pack = modelpack.open_pack(pack_path) if pack_path else None
+    shared = global_model.open_global_model(global_path)
+    # company -> (artifact mtimes, (model, scaler, data_scaled)); reloaded when the files change
+    loaded = {}
+
+    def artifacts(company):
+        version = forecasting.artifact_version(company, base_dir, pack, shared)
+        if company not in loaded or loaded[company][0] != version:
+            loaded[company] = (version, forecasting.load_artifacts(company, base_dir, pack, shared))
+        return loaded[company][1]
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        # kind "forecast": (days, window, with_backtest); "scenarios": (days, window, variants, grsi_norm);
+        # "global": (companies, days, windows) on the shared model, company is only a label
+        # expires_at: absolute time.time() expiry (None = no deadline), so time spent in the queue counts
+        req_id, company, expires_at, kind, args = task
+        if kind == "evict":
+            # ticker moved to another shard: free its artifacts (no result is sent)
+            loaded.pop(company, None)
+            continue
+        start = time.perf_counter()
+        try:
+            remaining = expires_at - time.time() if expires_at is not None else None
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded("Request deadline exceeded before inference started")
+            deadline = Deadline(remaining) if remaining is not None else None
+            if kind == "global":
+                if shared is None:
+                    raise forecasting.ForecastError("global model is not loaded in this worker")
+                companies, days, windows = args
+                loaded_for = [artifacts(c) for c in companies]
+                windows = [w if w is not None else data_scaled[-shared.seq_length:]
+                           for w, (_, _, data_scaled) in zip(windows, loaded_for)]
+                paths = global_model.forecast_mixed(shared, companies, windows, days, deadline)
+                out = [forecasting.inverse_close(scaler, path, data_scaled.shape[1])
+                       for path, (_, scaler, data_scaled) in zip(paths, loaded_for)]
+            elif kind == "scenarios":
+                model, scaler, data_scaled = artifacts(company)
+                days, window, variants, grsi_norm = args
+                window = window if window is not None else data_scaled[-forecasting.SEQ_LENGTH:]
+                out = scenarios.run_scenarios(model, scaler, window, days, variants, grsi_norm, deadline)
+            else:
+                model, scaler, data_scaled = artifacts(company)
+                days, window, with_backtest = args
+                out = forecasting.forecast_series(model, scaler, data_scaled, days, window, deadline=deadline,
+                                                  with_backtest=with_backtest)
+            results.put((req_id, idx, "ok", out, time.perf_counter() - start, sorted(loaded)))
+        except Rejected as exc:
+            results.put((req_id, idx, "rejected", (type(exc).__name__, str(exc), exc.retry_after),
+                         time.perf_counter() - start, sorted(loaded)))
+        except forecasting.ForecastError as exc:
+            results.put((req_id, idx, "error", f"{company}: {exc}", time.perf_counter() - start, sorted(loaded)))
+        except Exception:
+            logging.error(f"Worker {idx} failed on {company}:\n{traceback.format_exc()}")
+            results.put((req_id, idx, "error", f"Inference failed for {company}", time.perf_counter() - start,
+                         sorted(loaded)))
+
+
+# ------------------------
+# Pool: one task queue per worker so a ticker always lands where it is loaded
+# ------------------------
+class InferencePool:
+    def __init__(self, workers, threads=1, affinity=False, base_dir=None, pack_path=None, global_path=None):
+        self.size = workers
+        self.threads = threads
+        self.affinity = affinity
+        self.base_dir = base_dir or os.getcwd()
+        self.pack_path = pack_path
+        self.global_path = global_path
+        self.ctx = multiprocessing.get_context("spawn")
+        self.results = self.ctx.Queue()
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        self.pending = {}
+        self.routes = {}
+        self.workers = [None] * workers
+        self.stats_by_worker = [None] * workers
+        for idx in range(workers):
+            self._start_worker(idx)
+
+        self.closed = False
+        self.dispatcher = threading.Thread(target=self._dispatch, name="inference-dispatch", daemon=True)
+        self.dispatcher.start()
+        atexit.register(self.shutdown)
+
+    def _cores(self, idx):
+        if not self.affinity or not hasattr(os, "sched_getaffinity"):
+            return None
+        available = sorted(os.sched_getaffinity(0))
+        lo = (idx * self.threads) % len(available)
+        return set(available[lo:lo + self.threads]) or None
+
+    def _start_worker(self, idx):
+        tasks = self.ctx.Queue()
+        cores = self._cores(idx)
+        # spawned children inherit os.environ at start(): set the thread budget around it
+        saved = {name: os.environ.get(name) for name in thread_env(self.threads)}
+        os.environ.update(thread_env(self.threads))
+        try:
+            proc = self.ctx.Process(target=worker_main, name=f"inference-{idx}", daemon=True,
+                                    args=(idx, tasks, self.results, self.base_dir, self.pack_path,
+                                          self.threads, cores, self.global_path))
+            proc.start()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        self.workers[idx] = (proc, tasks)
+        self.stats_by_worker[idx] = {"pid": proc.pid, "cores": sorted(cores) if cores else None,
+                                     "threads": self.threads, "tickers": [], "in_flight": 0,
+                                     "completed": 0, "errors": 0, "avg_seconds": 0.0}
+        logging.info(f"Inference worker {idx} started (pid {proc.pid}, threads {self.threads}, cores {cores})")
+
+    def _route(self, company):
+        with self.lock:
+            idx = self.routes.get(company)
+            if idx is None:
+                # new ticker -> worker with the fewest tickers, then the least busy
+                counts = [sum(1 for w in self.routes.values() if w == i) for i in range(self.size)]
+                idx = min(range(self.size), key=lambda i: (counts[i], self.stats_by_worker[i]["in_flight"]))
+                self.routes[company] = idx
+            return idx
+
+    def _submit(self, company, deadline, kind, args, idx=None):
+        if deadline is not None:
+            deadline.check()
+        idx = self._route(company) if idx is None else idx
+        future = Future()
+        req_id = next(self.ids)
+        remaining = deadline.remaining() if deadline is not None else None
+        expires_at = time.time() + remaining if remaining is not None else None
+        with self.lock:
+            self.pending[req_id] = (future, idx)
+            self.stats_by_worker[idx]["in_flight"] += 1
+        self.workers[idx][1].put((req_id, company, expires_at, kind, args))
+        return future
+
+    def submit(self, company, days, window=None, deadline=None, with_backtest=True):
+        return self._submit(company, deadline, "forecast", (days, window, with_backtest))
+
+    def _wait(self, future, deadline):
+        timeout = None
+        if deadline is not None and deadline.remaining() is not None:
+            # small grace so the worker's own deadline check reports first
+            timeout = deadline.remaining() + 1.0
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise DeadlineExceeded(f"Request deadline of {deadline.seconds}s exceeded")
+
+    def run(self, company, days, window=None, deadline=None, with_backtest=True):
+        return self._wait(self.submit(company, days, window, deadline, with_backtest), deadline)
+
+    def run_scenarios(self, company, days, window, variants, grsi_norm=0.0, deadline=None):
+        # what-if batch (utils.scenarios.run_scenarios) on the worker that holds the ticker
+        future = self._submit(company, deadline, "scenarios", (days, window, variants, grsi_norm))
+        return self._wait(future, deadline)
+
+    def run_global(self, companies, days, windows, deadline=None):
+        # one mixed-company rollout (utils.global_model.forecast_mixed) -> rescaled paths;
+        # every worker holds the shared weights, so it goes to the least busy one
+        with self.lock:
+            idx = min(range(self.size), key=lambda i: self.stats_by_worker[i]["in_flight"])
+        future = self._submit("global", deadline, "global", (list(companies), days, list(windows)), idx)
+        return self._wait(future, deadline)
+
+    def evict(self, companies):
+        # drop the tickers' routes and their artifacts; global batches may have loaded a
+        # ticker's scaler and dataset on any worker, so every worker gets the eviction
+        with self.lock:
+            for company in companies:
+                self.routes.pop(company, None)
+        for company in companies:
+            for _, tasks in self.workers:
+                tasks.put((None, company, None, "evict", None))
+
+    def run_many(self, requests, deadline=None, with_backtest=False):
+        # requests: [(company, days, window)]; fans out across workers, results in order
+        futures = [self.submit(company, days, window, deadline, with_backtest) for company, days, window in requests]
+        return [self._wait(future, deadline) for future in futures]
+
+    def _dispatch(self):
+        # liveness is checked on a timer, not only when results go quiet, so a dead
+        # worker's pending requests fail under steady traffic too
+        last_check = time.monotonic()
+        while not self.closed:
+            if time.monotonic() - last_check >= CHECK_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                req_id, idx, kind, payload, seconds, tickers = self.results.get(timeout=CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future, _ = self.pending.pop(req_id, (None, None))
+                stats = self.stats_by_worker[idx]
+                stats["in_flight"] -= 1
+                stats["completed"] += 1
+                stats["tickers"] = tickers
+                stats["avg_seconds"] = round(0.8 * stats["avg_seconds"] + 0.2 * seconds, 4)
+                if kind != "ok":
+                    stats["errors"] += 1
+            if future is None:
+                continue
+            if kind == "ok":
+                future.set_result(payload)
+            elif kind == "rejected":
+                name, message, retry_after = payload
+                future.set_exception(getattr(admission, name, Rejected)(message, retry_after))
+            else:
+                future.set_exception(WorkerError(payload))
+
+    def _check_workers(self):
+        for idx, (proc, _) in enumerate(self.workers):
+            if proc.is_alive() or self.closed:
+                continue
+            logging.error(f"Inference worker {idx} (pid {proc.pid}) died with code {proc.exitcode}; restarting")
+            with self.lock:
+                failed = [rid for rid, (_, w) in self.pending.items() if w == idx]
+                for rid in failed:
+                    self.pending.pop(rid)[0].set_exception(WorkerError("Inference worker crashed"))
+                for company in [c for c, w in self.routes.items() if w == idx]:
+                    del self.routes[company]
+            self._start_worker(idx)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.size,
+                "threads_per_worker": self.threads,
+                "affinity": self.affinity,
+                "cpu_count": os.cpu_count(),
+                "routes": dict(self.routes),
+                "per_worker": [dict(s) for s in self.stats_by_worker],
+            }
+
+    def shutdown(self):
+        if self.closed:
+            return
+        self.closed = True
+        for proc, tasks in self.workers:
+            tasks.put(None)
+        for proc, _ in self.workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()